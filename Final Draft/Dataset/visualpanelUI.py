@@ -1,67 +1,80 @@
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import datetime
 
+# The shared loaders live in the Final Draft folder, one level up from this script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalog import DatasetCatalog
+from cohort import cohortStats
+from ingest import readFiles
+from time_axis import displayOffsets, toWallClock
+from timeseries_store import TimeSeriesStore
+
 class DataLoader:
     def __init__(self):
         self.metadata_files = []
         self.summary_files = []
         self.sensor_data = pd.DataFrame()
-
-    def readCSV(self):
-        data_folder = 'Dataset'
-
-        # List of all the date folders
-        date_folders = ['20200118', '20200119', '20200120', '20200121']  # January 18th-21st, 2020
-
-        # List of all the subfolders within the date folders
-        subfolders = ['310', '311', '312']
-
-        # Loop through the date folders and subfolders
-        for date_folder in date_folders:
-            for subfolder in subfolders:
-                folder_path = os.path.join(data_folder, date_folder, subfolder)
-
-                # Check if the folder exists
-                if os.path.exists(folder_path):
-                    metadata_file_path = os.path.join(folder_path, 'metadata.csv')
-                    summary_file_path = os.path.join(folder_path, 'summary.csv')
-
-                    # Check if the metadata.csv file exists
-                    if os.path.isfile(metadata_file_path):
-                        self.metadata_files.append(metadata_file_path)
-
-                    # Check if the summary.csv file exists
-                    if os.path.isfile(summary_file_path):
-                        self.summary_files.append(summary_file_path)
-
-        # Load the metadata files into a DataFrame
-        metadata_df = [pd.read_csv(file) for file in self.metadata_files]
-
-        # Load the summary files into a DataFrame
-        summary_df = [pd.read_csv(file) for file in self.summary_files]
+        self.load_report = []
+        self.participant_rows = {}
+
+    def readCSV(self, workers=None):
+        # The catalog already knows which date/participant folders hold data, so no folder probing is needed
+        catalog = DatasetCatalog('Dataset')
+        entries = catalog.entries()
+        self.metadata_files = [catalog.path(entry, 'metadata') for entry in entries if entry['metadata'] is not None]
+        self.summary_files = [catalog.path(entry) for entry in entries]
+
+        # Load the metadata and summary files in parallel, results come back in the same order as the file lists
+        frames, self.load_report = readFiles(self.metadata_files + self.summary_files, workers=workers)
+
+        for file_report in self.load_report:
+            if file_report['error'] is not None:
+                print(f"Could not load {file_report['path']}: {file_report['error']}")
+
+        # Tag every row with the participant and date folder it came from
+        folders = {catalog.path(entry, kind): entry for entry in entries for kind in ('metadata', 'summary')}
+        loaded_reports = [file_report for file_report in self.load_report if file_report['error'] is None]
+        for df, file_report in zip(frames, loaded_reports):
+            df['Participant'] = folders[file_report['path']]['participant']
+            df['Date'] = folders[file_report['path']]['date']
 
         # Merge the metadata and summary DataFrames
-        self.sensor_data = pd.concat(metadata_df + summary_df)
+        self.sensor_data = pd.concat(frames) if frames else pd.DataFrame()
+        for column in ['Participant', 'Date']:
+            if column in self.sensor_data.columns:
+                self.sensor_data[column] = self.sensor_data[column].astype('category')
+
+        # Row positions of every participant, found by one group-by instead of a boolean mask per lookup
+        self.participant_rows = {}
+        if 'Participant' in self.sensor_data.columns:
+            self.participant_rows = self.sensor_data.groupby('Participant', observed=True, sort=False).indices
 
     def getParticipants(self):
         # Get unique participants from the loaded sensor data
-        participants = self.sensor_data['Participant'].unique().tolist()
+        participants = list(self.participant_rows)
         return participants
 
     def getDataStreams(self, participant):
         # Get available data streams for a specific participant
-        participant_data = self.sensor_data[self.sensor_data['Participant'] == participant]
-        data_streams = participant_data.columns.tolist()
+        data_streams = self.sensor_data.columns.tolist()
         return data_streams
 
     def getParticipantData(self, participant, data_streams):
         # Get sensor data for the specified participant and data streams
-        participant_data = self.sensor_data[self.sensor_data['Participant'] == participant]
-        selected_data = participant_data[data_streams]
+        rows = self.participant_rows.get(participant, [])
+        selected_data = self.sensor_data.iloc[rows][data_streams]
         return selected_data
 
+    def getCohortStats(self, level='day', data_streams=None, workers=None):
+        # Count, mean, std. dev, min and max of every stream for every participant ('participant'),
+        # participant and day ('day') or participant, day and hour ('hour'), worked out on all cores
+        # from the memory-mapped store instead of the frames loaded here
+        store = TimeSeriesStore(DatasetCatalog('Dataset'))
+        return cohortStats(level, data_streams, workers=workers, store=store)
+
 class VisualPanel:
     def __init__(self):
         self.time_series = []
@@ -74,6 +87,12 @@ class VisualPanel:
         self.chart_type = chart_type
 
     def displayChart(self):
+        # Several synchronized streams are drawn as stacked panels sharing the time axis,
+        # so zooming or panning one panel moves all of them
+        if isinstance(self.time_series, pd.DataFrame):
+            self.displayPanels()
+            return
+
         # Display the time series data using the specified chart type
         if self.chart_type == "line":
             plt.plot(self.time_series)
@@ -86,16 +105,30 @@ class VisualPanel:
         plt.title("Sensor Data Visualization")
         plt.show()
 
+    def displayPanels(self):
+        streams = list(self.time_series.columns)
+        fig, axes = plt.subplots(len(streams), 1, sharex=True, squeeze=False, figsize=(10, 2 * len(streams)))
+        for ax, stream in zip(axes[:, 0], streams):
+            if self.chart_type == "line":
+                ax.plot(self.time_series.index, self.time_series[stream])
+            elif self.chart_type == "scatter":
+                ax.scatter(self.time_series.index, self.time_series[stream], s=2)
+            ax.set_ylabel(stream)
+
+        axes[-1, 0].set_xlabel("Time")
+        fig.suptitle("Sensor Data Visualization")
+        plt.show()
+
 class TimeConverter:
     def __init__(self):
+        # One of time_axis.timeModes: "UTC", "Participant local" or "Viewer local"
         self.timezone = "UTC"
 
-    def convertToTimezone(self, timestamp):
-        # Convert timestamp to the specified timezone (UTC or local time)
-        if self.timezone == "local":
-            # Perform timezone conversion using appropriate libraries or functions
-            pass
-        return timestamp
+    def convertToTimezone(self, timestamps, timezone_minutes=None):
+        # Convert a whole column of epoch ms timestamps at once, participant local time uses
+        # the per-row 'Timezone (minutes)' column from summary.csv
+        offsets = displayOffsets(self.timezone, timestamps, timezone_minutes)
+        return toWallClock(timestamps, offsets)
 
 class DataExplorer:
     def __init__(self, data_loader, visual_panel, time_converter):
@@ -105,13 +138,22 @@ class DataExplorer:
 
     def exploreData(self, participant, data_streams):
         # Get the sensor data for the specified participant and data streams
-        participant_data = self.data_loader.getParticipantData(participant, data_streams)
-
-        # Convert timestamps to the desired timezone
-        participant_data['Timestamp'] = participant_data['Timestamp'].apply(self.time_converter.convertToTimezone)
-
-        # Synchronize the time series across data streams
-        synchronized_data = participant_data[data_streams].copy()
+        time_columns = ['Unix Timestamp (UTC)', 'Timezone (minutes)']
+        participant_data = self.data_loader.getParticipantData(
+            participant, [stream for stream in data_streams if stream not in time_columns] + time_columns)
+
+        # Only summary rows have timestamps, metadata rows can't be placed in time
+        participant_data = participant_data.dropna(subset=time_columns).copy()
+
+        # Convert timestamps to the desired timezone in one go
+        participant_data['Timestamp'] = self.time_converter.convertToTimezone(
+            participant_data['Unix Timestamp (UTC)'].to_numpy(), participant_data['Timezone (minutes)'].to_numpy())
+
+        # Synchronize the time series across data streams: one row per timestamp in time order, with
+        # every numeric stream as a column (text columns and the time columns themselves can't be plotted)
+        streams = [stream for stream in data_streams if stream not in time_columns
+                   and pd.api.types.is_numeric_dtype(participant_data[stream])]
+        synchronized_data = participant_data.set_index('Timestamp')[streams].sort_index().dropna(axis=1, how='all')
 
         # Display the synchronized time series using the visual panel
         self.visual_panel.setTimeSeries(synchronized_data)
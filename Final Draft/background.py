@@ -0,0 +1,123 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    # Raised inside a job's function to stop it once a newer job has replaced it
+    pass
+
+
+class Job:
+    # One piece of work handed to the BackgroundWorker. The job is passed to its function as the first
+    # argument, so long running work can report progress and stop early once it has been cancelled.
+
+    def __init__(self, worker, kind, onDone=None, onError=None, onProgress=None):
+        self.worker = worker
+        self.kind = kind
+        self.onDone = onDone
+        self.onError = onError
+        self.onProgress = onProgress
+        self.future = None
+        self.cancelledEvent = threading.Event()
+
+    def cancelled(self):
+        return self.cancelledEvent.is_set()
+
+    def cancel(self):
+        self.cancelledEvent.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def raiseIfCancelled(self):
+        if self.cancelled():
+            raise JobCancelled()
+
+    def progress(self, *args):
+        # Safe to call from the worker thread, onProgress(*args) runs later on the Tk thread
+        if not self.cancelled():
+            self.worker.results.put((self, 'progress', args))
+
+
+class BackgroundWorker:
+    # Runs loading, parsing, statistics and database work off the Tk thread. Results come back through a
+    # queue that is polled with widget.after, so every callback runs on the Tk thread and widgets can be
+    # touched from them. Only the newest job of each kind counts: submitting a job cancels the previous
+    # one of the same kind, and results of cancelled jobs are dropped.
+    # Threads are used because the csv parser, numpy and the database driver release the GIL, and the
+    # dataset cache the jobs fill has to live in this process.
+
+    def __init__(self, widget, workers=2, pollMs=50):
+        self.widget = widget
+        self.pollMs = pollMs
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.results = queue.Queue()
+        self.current = {}
+        self.polling = None
+
+    def submit(self, kind, fn, *args, onDone=None, onError=None, onProgress=None):
+        # fn(job, *args) runs on a worker thread, then onDone(result) or onError(exception) on the Tk thread
+        self.cancel(kind)
+
+        job = Job(self, kind, onDone, onError, onProgress)
+        self.current[kind] = job
+        job.future = self.pool.submit(self.run, job, fn, args)
+        self.startPolling()
+        return job
+
+    def run(self, job, fn, args):
+        if job.cancelled():
+            return
+        try:
+            self.results.put((job, 'done', fn(job, *args)))
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.results.put((job, 'error', e))
+
+    def cancel(self, kind):
+        job = self.current.pop(kind, None)
+        if job is not None:
+            job.cancel()
+
+    def startPolling(self):
+        if self.polling is None:
+            self.polling = self.widget.after(self.pollMs, self.poll)
+
+    def poll(self):
+        self.polling = None
+        try:
+            while True:
+                try:
+                    job, status, value = self.results.get_nowait()
+                except queue.Empty:
+                    break
+
+                if job.cancelled():
+                    continue
+                if status == 'progress':
+                    if job.onProgress is not None:
+                        job.onProgress(*value)
+                    continue
+
+                if self.current.get(job.kind) is job:
+                    del self.current[job.kind]
+                if status == 'done':
+                    if job.onDone is not None:
+                        job.onDone(value)
+                elif job.onError is not None:
+                    job.onError(value)
+                else:
+                    raise value
+        finally:
+            # Keep polling while there is still work out
+            if self.current:
+                self.startPolling()
+
+    def shutdown(self):
+        for kind in list(self.current):
+            self.cancel(kind)
+        if self.polling is not None:
+            self.widget.after_cancel(self.polling)
+            self.polling = None
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,162 @@
+import argparse
+import fnmatch
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+# No display is needed, figures are only written to files
+matplotlib.use('Agg')
+from matplotlib import style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from catalog import DatasetCatalog
+from dataset_cache import DatasetCache
+from decimate import decimationModes
+from plot_artists import ArtistManager
+from plot_series import dataStreamNames, formatTime, graphTypes, seriesFor
+from time_axis import clockToMs, timeModes
+
+style.use("dark_background")
+
+# Renders the same figures as the Tk app for every (client, stream, chart type, time mode) combination, e.g.
+#   python batch_render.py --clients "20200118/*" --streams "Eda avg" --formats png svg --out figures
+# Each client is rendered by one worker process, so every file is decoded once per time mode.
+
+
+def fileName(name):
+    return re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_').lower()
+
+
+def clockTime(text):
+    try:
+        hours, minutes, seconds = (int(part) for part in text.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not in HH:MM:SS format")
+    return clockToMs(hours, minutes, seconds)
+
+
+def renderClient(task):
+    # Renders every requested figure of one client and returns one timing record per figure
+    cache = DatasetCache(dataStreamNames)
+    fig = Figure(figsize=task['size'], dpi=task['dpi'])
+    FigureCanvasAgg(fig)  # Attaches an Agg canvas to the figure
+    ax = fig.add_subplot(111)
+    # No canvas for the manager: the figure is drawn once, by savefig
+    artists = ArtistManager(ax, None, formatter=formatTime)
+    maxPoints = max(2 * int(ax.bbox.width), 100)
+
+    folder = os.path.join(task['out'], *task['client'].split('/'))
+    os.makedirs(folder, exist_ok=True)
+
+    records = []
+    for timeMode in task['modes']:
+        start = time.perf_counter()
+        try:
+            view = cache.getView(task['path'], timeMode)
+            pyramid = cache.getPyramid(task['path'])
+            index = cache.getIndex(task['path'], timeMode)
+        except Exception as e:
+            records.append({'client': task['client'], 'figure': f"{timeMode} (load)", 'files': [], 'points': 0,
+                            'seconds': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"})
+            continue
+        loadSeconds = time.perf_counter() - start
+
+        for stream in task['streams']:
+            for graphType in task['charts']:
+                start = time.perf_counter()
+                record = {'client': task['client'], 'figure': f"{stream} / {graphType} / {timeMode}", 'files': [],
+                          'points': 0, 'error': None}
+                try:
+                    xValues, yValues = seriesFor(view, pyramid, timeMode, stream, graphType, task['decimation'],
+                                                 task['timeRange'], maxPoints, index)
+                    artists.show(graphType, xValues, yValues, stream)
+                    fig.suptitle(f"{task['client']} ({timeMode})", color='cornflowerblue')
+
+                    for extension in task['formats']:
+                        path = os.path.join(folder, f"{fileName(stream)}_{fileName(graphType)}_"
+                                                    f"{fileName(timeMode)}.{extension}")
+                        fig.savefig(path)
+                        record['files'].append(path)
+                    record['points'] = len(xValues)
+                except Exception as e:
+                    record['error'] = f"{type(e).__name__}: {e}"
+
+                # The first figure of each time mode also pays for reading the file
+                record['seconds'] = time.perf_counter() - start + loadSeconds
+                loadSeconds = 0.0
+                records.append(record)
+    return records
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Render plots for every client without opening a window.")
+    parser.add_argument('--dataset', default='Dataset', help="dataset folder (default: Dataset)")
+    parser.add_argument('--out', default='figures', help="output folder (default: figures)")
+    parser.add_argument('--clients', nargs='+', default=['*'],
+                        help="client names or patterns such as '20200118/*' (default: all)")
+    parser.add_argument('--streams', nargs='+', choices=dataStreamNames, default=dataStreamNames)
+    parser.add_argument('--charts', nargs='+', choices=graphTypes, default=graphTypes)
+    parser.add_argument('--modes', nargs='+', choices=timeModes, default=timeModes)
+    parser.add_argument('--formats', nargs='+', choices=['png', 'svg'], default=['png'])
+    parser.add_argument('--decimation', choices=decimationModes, default=decimationModes[0])
+    parser.add_argument('--start', type=clockTime, help="start of the time range, HH:MM:SS")
+    parser.add_argument('--end', type=clockTime, help="end of the time range, HH:MM:SS")
+    parser.add_argument('--size', nargs=2, type=float, default=[10, 5], metavar=('WIDTH', 'HEIGHT'),
+                        help="figure size in inches (default: 10 5)")
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU, 1 renders in this process)")
+    args = parser.parse_args(argv)
+
+    if (args.start is None) != (args.end is None) or (args.start is not None and args.start >= args.end):
+        parser.error("--start and --end have to be given together, with start before end")
+    return args
+
+
+def run(argv=None):
+    args = parseArgs(argv)
+    catalog = DatasetCatalog(args.dataset)
+
+    clients = [name for name in catalog.clientNames()
+               if any(fnmatch.fnmatch(name, pattern) for pattern in args.clients)]
+    if not clients:
+        print("No clients match", ' '.join(args.clients))
+        return []
+
+    tasks = [{'client': client, 'path': catalog.path(catalog.getFile(client)), 'out': args.out,
+              'streams': args.streams, 'charts': args.charts, 'modes': args.modes, 'formats': args.formats,
+              'decimation': args.decimation, 'timeRange': None if args.start is None else (args.start, args.end),
+              'size': tuple(args.size), 'dpi': args.dpi}
+             for client in clients]
+
+    workers = args.workers or min(len(tasks), os.cpu_count() or 1)
+    start = time.perf_counter()
+    records = []
+
+    def report(clientRecords):
+        for record in clientRecords:
+            status = record['error'] or f"{record['points']} points"
+            print(f"{record['seconds'] * 1000:8.1f} ms  {record['client']}  {record['figure']}  ({status})")
+        records.extend(clientRecords)
+
+    if workers == 1:
+        for task in tasks:
+            report(renderClient(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(renderClient, task) for task in tasks]):
+                report(future.result())
+
+    rendered = [record for record in records if record['error'] is None]
+    failed = len(records) - len(rendered)
+    print(f"{len(rendered)} figures for {len(clients)} clients in {time.perf_counter() - start:.1f} s "
+          f"with {workers} workers" + (f", {failed} failed" if failed else ""))
+    return records
+
+
+if __name__ == "__main__":
+    run()
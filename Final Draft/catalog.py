@@ -0,0 +1,168 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from sidecar import readCsv
+
+catalogVersion = 1
+
+
+def previousDayFile(csvPath):
+    # The same participant's file of the closest earlier date folder, or None. Day files overlap around
+    # midnight, so that is where readings of this file can show up a second time.
+    folder, name = os.path.split(os.path.abspath(csvPath))
+    dateFolder, participant = os.path.split(folder)
+    dataFolder, date = os.path.split(dateFolder)
+    for earlier in reversed([other for other in DatasetCatalog.listFolders(dataFolder) if other < date]):
+        path = os.path.join(dataFolder, earlier, participant, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def sharedRows(timestamps, previousPath):
+    # Which of a day file's readings (given by their timestamps) the file at previousPath holds too.
+    # Anything that puts a file together with its previous day's file leaves these rows out, so every
+    # reading is counted once, while a file on its own keeps them all. All False for previousPath None.
+    timestamps = np.asarray(timestamps, dtype='int64')
+    if previousPath is None:
+        return np.zeros(len(timestamps), dtype=bool)
+
+    try:
+        previous = readCsv(previousPath, usecols=['Unix Timestamp (UTC)'])['Unix Timestamp (UTC)'].dropna()
+    except (OSError, ValueError):
+        return np.zeros(len(timestamps), dtype=bool)
+    return np.isin(timestamps, previous.to_numpy(dtype='int64'))
+
+
+class DatasetCatalog:
+    # Index of every Dataset/<date>/<participant>/summary.csv. It is saved to Dataset/catalog.json and on
+    # refresh only files whose mtime or size changed get opened again, so the dropdowns, loaders and range
+    # queries can be answered from here without touching the data files.
+
+    def __init__(self, dataFolder='Dataset'):
+        self.dataFolder = dataFolder
+        self.catalogPath = os.path.join(dataFolder, 'catalog.json')
+        self.files = {}
+        self.load()
+        self.refresh()
+
+    def load(self):
+        try:
+            with open(self.catalogPath) as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if catalog.get('version') == catalogVersion:
+            self.files = {entry['key']: entry for entry in catalog['files']}
+
+    def save(self):
+        catalog = {'version': catalogVersion, 'files': [self.files[key] for key in sorted(self.files)]}
+
+        try:
+            with open(self.catalogPath, 'w') as f:
+                json.dump(catalog, f, indent=1)
+        except OSError:
+            # A read only dataset still works, it just gets rescanned next time
+            pass
+
+    @staticmethod
+    def listFolders(path):
+        try:
+            return sorted(entry.name for entry in os.scandir(path) if entry.is_dir() and not entry.name.startswith('.'))
+        except OSError:
+            return []
+
+    def describeFile(self, key, date, participant, folderPath, stat):
+        summaryPath = os.path.join(folderPath, 'summary.csv')
+        metadataPath = os.path.join(folderPath, 'metadata.csv')
+
+        columns = pd.read_csv(summaryPath, nrows=0).columns.tolist()
+        rows, first, last = 0, None, None
+
+        if 'Unix Timestamp (UTC)' in columns:
+            timestamps = readCsv(summaryPath, usecols=['Unix Timestamp (UTC)'])['Unix Timestamp (UTC)'].dropna()
+            rows = len(timestamps)
+            if rows:
+                first, last = int(timestamps.min()), int(timestamps.max())
+
+        return {
+            'key': key,
+            'date': date,
+            'participant': participant,
+            # Paths are kept relative to the dataset folder so the catalog survives moving the project
+            'summary': os.path.join(key, 'summary.csv'),
+            'metadata': os.path.join(key, 'metadata.csv') if os.path.isfile(metadataPath) else None,
+            'rows': rows,
+            'first': first,
+            'last': last,
+            'columns': columns,
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size
+        }
+
+    def refresh(self):
+        found = {}
+        changed = False
+
+        for date in self.listFolders(self.dataFolder):
+            for participant in self.listFolders(os.path.join(self.dataFolder, date)):
+                folderPath = os.path.join(self.dataFolder, date, participant)
+                key = os.path.join(date, participant)
+
+                try:
+                    stat = os.stat(os.path.join(folderPath, 'summary.csv'))
+                except OSError:
+                    continue
+
+                entry = self.files.get(key)
+                if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                    try:
+                        entry = self.describeFile(key, date, participant, folderPath, stat)
+                    except (pd.errors.EmptyDataError, pd.errors.ParserError):
+                        continue
+                    changed = True
+
+                found[key] = entry
+
+        if changed or found.keys() != self.files.keys():
+            self.files = found
+            self.save()
+
+    def clientNames(self):
+        return sorted(self.files)
+
+    def getFile(self, clientName):
+        return self.files.get(clientName)
+
+    def path(self, entry, kind='summary'):
+        return None if entry[kind] is None else os.path.join(self.dataFolder, entry[kind])
+
+    def entries(self, participants=None, dates=None):
+        return [self.files[key] for key in sorted(self.files)
+                if (participants is None or self.files[key]['participant'] in participants)
+                and (dates is None or self.files[key]['date'] in dates)]
+
+    def previousEntry(self, entry, entries=None):
+        # Entry of the same participant's previous day file (see previousDayFile), if it is one of entries
+        # (of the whole catalog for None)
+        previousPath = previousDayFile(self.path(entry))
+        if previousPath is None:
+            return None
+        for other in self.entries() if entries is None else entries:
+            if os.path.abspath(self.path(other)) == previousPath:
+                return other
+        return None
+
+    def sharedRows(self, entry, timestamps, entries=None):
+        # sharedRows of an entry's file, for when it is put together with the rest of entries
+        previous = self.previousEntry(entry, entries)
+        return sharedRows(timestamps, None if previous is None else self.path(previous))
+
+    def overlapping(self, startMs, endMs, participants=None):
+        # Files whose [first, last] timestamps intersect [startMs, endMs]
+        return [entry for entry in self.entries(participants)
+                if entry['first'] is not None and entry['first'] <= endMs and entry['last'] >= startMs]
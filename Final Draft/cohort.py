@@ -0,0 +1,144 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from time_axis import displayOffsets, msPerDay, msPerHour
+from timeseries_store import TimeSeriesStore, columnFile, sharedColumn, storeStreams, timestampColumn, timezoneColumn
+
+# Cohort statistics: count, mean, std. dev, min and max of every stream per participant, per participant
+# and day, or per participant, day and hour, e.g.
+#   cohortStats('day', ['Eda avg', 'Temp avg'])
+# The rows come from the memory-mapped TimeSeriesStore. Participants are split into shards of about the
+# same number of rows and every shard is grouped by one worker process with a single sort and reduceat
+# over all streams at once, so nothing loops over participants, days or hours in python.
+cohortLevels = {'participant': ['Participant'], 'day': ['Participant', 'Date'],
+                'hour': ['Participant', 'Date', 'Hour']}
+cohortStatNames = ['count', 'mean', 'std', 'min', 'max']
+
+# Shards per worker, so a few big participants don't leave the other workers idle at the end
+shardsPerWorker = 4
+
+
+def groupStarts(keys):
+    # First row of every run of equal keys (keys is a list of sorted arrays, most significant first)
+    changed = np.zeros(len(keys[0]), dtype=bool)
+    if len(changed):
+        changed[0] = True
+    for key in keys:
+        changed[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(changed)
+
+
+def groupStats(values, starts):
+    # Stats of every group of rows (columns are streams), blanks skipped. The std. dev takes a second
+    # pass over the deviations from each group's mean, so it doesn't suffer from cancellation.
+    present = ~np.isnan(values)
+    count = np.add.reduceat(present.astype('int64'), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0) / count
+        sizes = np.diff(np.append(starts, len(values)))
+        deviations = np.where(present, values - np.repeat(mean, sizes, axis=0), 0.0)
+        std = np.sqrt(np.add.reduceat(deviations * deviations, starts, axis=0) / (count - 1))
+    low = np.minimum.reduceat(np.where(present, values, np.inf), starts, axis=0)
+    high = np.maximum.reduceat(np.where(present, values, -np.inf), starts, axis=0)
+
+    empty = count == 0
+    return {'count': count, 'mean': mean, 'std': np.where(count > 1, std, np.nan),
+            'min': np.where(empty, np.nan, low), 'max': np.where(empty, np.nan, high)}
+
+
+def shardStats(task):
+    # Runs in a worker process: groups the rows of a few participants (none of them empty), read straight
+    # from the store files
+    arrays = {name: np.load(os.path.join(task['storeFolder'], columnFile(name)), mmap_mode='r')
+              for name in [timestampColumn, timezoneColumn, sharedColumn] + task['streams']}
+
+    def gather(name, dtype):
+        return np.concatenate([np.asarray(arrays[name][start:stop], dtype=dtype)
+                               for participant, start, stop in task['ranges']])
+
+    participantIds = np.repeat(np.arange(len(task['ranges'])), [stop - start for _, start, stop in task['ranges']])
+
+    # Day files that overlap around midnight hold some readings twice. Shards cover whole participants,
+    # so the previous day's file is always there and its copy is the one that counts.
+    order = np.flatnonzero(~gather(sharedColumn, 'bool'))
+    timestamps, participantIds = gather(timestampColumn, 'int64')[order], participantIds[order]
+
+    timezones = np.nan_to_num(gather(timezoneColumn, 'float64')[order]).astype('int64')
+    wallClock = timestamps + displayOffsets(task['timeMode'], timestamps, timezones)
+    keys = {'Participant': participantIds, 'Date': wallClock // msPerDay, 'Hour': (wallClock % msPerDay) // msPerHour}
+    keys = [keys[name] for name in cohortLevels[task['level']]]
+
+    # Local days and hours follow the timestamps except where a participant's time zone changes,
+    # so a stable sort on the group keys keeps everything else in place
+    groupOrder = np.lexsort(keys[::-1])
+    keys = [key[groupOrder] for key in keys]
+    starts = groupStarts(keys)
+
+    values = np.column_stack([gather(stream, 'float64')[order][groupOrder] for stream in task['streams']])
+    stats = groupStats(values, starts)
+
+    index = {'Participant': np.array([participant for participant, _, _ in task['ranges']])[keys[0][starts]]}
+    if len(keys) > 1:
+        index['Date'] = pd.to_datetime(keys[1][starts], unit='D').strftime('%Y%m%d')
+    if len(keys) > 2:
+        index['Hour'] = keys[2][starts]
+
+    columns = pd.MultiIndex.from_product([task['streams'], cohortStatNames])
+    data = np.stack([stats[name] for name in cohortStatNames], axis=2).reshape(len(starts), -1)
+    return pd.DataFrame(data, index=pd.MultiIndex.from_arrays(list(index.values()), names=list(index)),
+                        columns=columns)
+
+
+def planShards(ranges, shards):
+    # Splits [(participant, start, stop)] into about `shards` runs with the same number of rows each
+    total = sum(stop - start for _, start, stop in ranges)
+    target = max(total / max(shards, 1), 1)
+    plan, current, size = [], [], 0
+    for participantRange in ranges:
+        current.append(participantRange)
+        size += participantRange[2] - participantRange[1]
+        if size >= target:
+            plan.append(current)
+            current, size = [], 0
+    if current:
+        plan.append(current)
+    return plan
+
+
+def cohortStats(level='day', streams=None, participants=None, timeMode='Participant local', workers=None,
+                store=None):
+    # DataFrame indexed by Participant (and Date as YYYYMMDD, and Hour) with a (stream, stat) column
+    # for every stream and every stat in cohortStatNames. workers=1 groups everything in this process.
+    if level not in cohortLevels:
+        raise ValueError(f"Unknown cohort level '{level}', expected one of {', '.join(cohortLevels)}")
+    streams = list(streams or storeStreams)
+    store = (store if store is not None else TimeSeriesStore()).open()
+
+    ranges = [(participant, *store.rows(participant)) for participant in sorted(store.participantRanges)
+              if participants is None or participant in participants]
+    ranges = [participantRange for participantRange in ranges if participantRange[2] > participantRange[1]]
+    if not ranges:
+        index = pd.MultiIndex.from_arrays([[]] * len(cohortLevels[level]), names=cohortLevels[level])
+        return pd.DataFrame(index=index, columns=pd.MultiIndex.from_product([streams, cohortStatNames]))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    tasks = [{'storeFolder': store.storeFolder, 'ranges': shard, 'streams': streams, 'level': level,
+              'timeMode': timeMode}
+             for shard in planShards(ranges, workers * shardsPerWorker if workers > 1 else 1)]
+
+    if workers == 1 or len(tasks) == 1:
+        frames = [shardStats(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            frames = list(pool.map(shardStats, tasks))
+
+    # Shards hold different participants, so their groups never have to be merged
+    return pd.concat(frames)
+
+
+if __name__ == "__main__":
+    print(cohortStats('day', ['Eda avg', 'Temp avg']))
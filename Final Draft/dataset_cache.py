@@ -0,0 +1,184 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from pyramid import loadPyramid
+from range_index import RangeIndex
+from rolling import rollingStats
+from sketch import loadSketches
+from streaming import StreamingStats, aggregate, collect, dropInvalid, iterSummary
+from time_axis import allOffsets, timeOfDay, timezoneColumn
+
+
+class DatasetCache:
+    # Keeps decoded summary.csv frames in memory so that switching the graph type, data stream or
+    # time zone only re-slices the data instead of re-reading and re-parsing the file.
+    # Entries are keyed by (path, mtime, size), so editing a file on disk invalidates it automatically,
+    # and the least recently used entries are evicted once the cache grows past maxBytes.
+
+    def __init__(self, columns, maxBytes=256 * 1024 * 1024):
+        self.columns = list(columns)
+        self.maxBytes = maxBytes
+        self.totalBytes = 0
+        self.entries = OrderedDict()
+        # Loads run on worker threads. The cache lock only guards the bookkeeping and is never held while a
+        # file is read; decoding and building views happen under a lock per file, so a big load doesn't hold
+        # up jobs on other files and two jobs on the same file don't decode it twice.
+        self.lock = threading.RLock()
+        self.fileLocks = {}
+
+    @staticmethod
+    def fileKey(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def frameBytes(df):
+        return int(df.memory_usage(deep=True).sum())
+
+    def decode(self, path, onChunk=None):
+        # Read and drop rows with missing data one chunk at a time. Until the view and its range index exist,
+        # the streams' stats are folded together chunk by chunk, so onChunk(partialStats, rowsSoFar) can show
+        # them while a big file is still loading.
+        stats = StreamingStats(self.columns, median=False)
+        chunks = aggregate(dropInvalid(iterSummary(path, self.columns + [timezoneColumn])), [stats])
+        return collect(chunks, None if onChunk is None else lambda chunk, rows: onChunk(stats, rows))
+
+    @staticmethod
+    def buildView(df, offsets):
+        # Time of day in ms for one display mode, worked out once and then sorted on
+        timeOfDayMs = timeOfDay(df['Unix Timestamp (UTC)'].to_numpy(dtype='int64'), offsets)
+        order = timeOfDayMs.argsort(kind='stable')
+
+        view = df.take(order)
+        view['TimeOfDayMs'] = timeOfDayMs[order]
+        return view, order
+
+    def fileLock(self, path):
+        with self.lock:
+            return self.fileLocks.setdefault(os.path.abspath(path), threading.RLock())
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def addBytes(self, entry, size):
+        with self.lock:
+            entry['bytes'] += size
+            # An entry that was evicted in the meantime no longer counts towards the total
+            if self.entries.get(entry['key']) is entry:
+                self.totalBytes += size
+                self.evict()
+
+    def getEntry(self, path, onChunk=None):
+        key = self.fileKey(path)
+        entry = self.lookup(key)
+        if entry is not None:
+            return key, entry
+
+        with self.fileLock(path):
+            # Another job may have loaded the file while this one waited for it
+            entry = self.lookup(key)
+            if entry is not None:
+                return key, entry
+
+            df = self.decode(path, onChunk)
+
+            # Offsets for every display mode are made once per file, so switching modes never recomputes them
+            offsets = allOffsets(df['Unix Timestamp (UTC)'].to_numpy(dtype='int64'), df[timezoneColumn].to_numpy())
+            # The aggregate pyramid is built (or extended) along with the file and kept in its sidecar folder
+            pyramid = loadPyramid(path, self.columns)
+            # So are the per-day quantile sketches
+            sketches = loadSketches(path, self.columns)
+            entry = {'key': key, 'df': df, 'offsets': offsets, 'views': {}, 'orders': {}, 'indexes': {},
+                     'rolling': {}, 'pyramid': pyramid, 'sketches': sketches,
+                     'bytes': self.frameBytes(df) + sum(array.nbytes for array in offsets.values()) + pyramid.nbytes()
+                     + sketches.nbytes()}
+
+            with self.lock:
+                # Any older version of this file is stale now
+                for oldKey in [k for k in self.entries if k[0] == key[0]]:
+                    self.remove(oldKey)
+                self.entries[key] = entry
+                self.totalBytes += entry['bytes']
+                self.evict()
+            return key, entry
+
+    def getPyramid(self, path, onChunk=None):
+        return self.getEntry(path, onChunk)[1]['pyramid']
+
+    def getSketches(self, path, onChunk=None):
+        return self.getEntry(path, onChunk)[1]['sketches']
+
+    def viewEntry(self, path, timeMode, onChunk=None):
+        # The file's entry, with the view of timeMode and its range index built
+        key, entry = self.getEntry(path, onChunk)
+        if timeMode in entry['views']:
+            return entry
+
+        with self.fileLock(path):
+            if timeMode not in entry['views']:
+                view, order = self.buildView(entry['df'], entry['offsets'][timeMode])
+                # The range index is built with the view, so any window of it can be summed up right away
+                index = RangeIndex(view['TimeOfDayMs'].to_numpy(), view, self.columns)
+                entry['orders'][timeMode] = order
+                entry['indexes'][timeMode] = index
+                entry['views'][timeMode] = view
+                self.addBytes(entry, self.frameBytes(view) + order.nbytes + index.nbytes())
+        return entry
+
+    def getView(self, path, timeMode, onChunk=None):
+        # Returned frames are shared with the cache, so callers must treat them as read-only.
+        # onChunk(partialStats, rowsSoFar) is called while a file that isn't cached yet is being read, and
+        # can raise to stop a load that is no longer wanted.
+        return self.viewEntry(path, timeMode, onChunk)['views'][timeMode]
+
+    def getIndex(self, path, timeMode, onChunk=None):
+        # RangeIndex over the view of one display mode
+        return self.viewEntry(path, timeMode, onChunk)['indexes'][timeMode]
+
+    def getRolling(self, path, stream, windowMs, timeMode, onChunk=None):
+        # Rolling window stats of one stream (see rolling.rollingStats), in the row order of the view of
+        # timeMode. They are worked out once per (file, stream, window) in time order and then only reordered.
+        entry = self.viewEntry(path, timeMode, onChunk)
+        rolling = entry['rolling'].get((stream, windowMs))
+
+        if rolling is None:
+            with self.fileLock(path):
+                rolling = entry['rolling'].get((stream, windowMs))
+                if rolling is None:
+                    timestamps = entry['df']['Unix Timestamp (UTC)'].to_numpy(dtype='int64')
+                    chronological = timestamps.argsort(kind='stable')
+                    stats = rollingStats(timestamps[chronological],
+                                         entry['df'][stream].to_numpy(dtype='float64')[chronological], windowMs)
+                    # Back to the row order of the decoded frame, which the views are picked from
+                    rolling = {}
+                    for name, values in stats.items():
+                        rolling[name] = np.empty_like(values)
+                        rolling[name][chronological] = values
+                    entry['rolling'][(stream, windowMs)] = rolling
+                    self.addBytes(entry, sum(values.nbytes for values in rolling.values()))
+
+        order = entry['orders'][timeMode]
+        return {name: values[order] for name, values in rolling.items()}
+
+    def remove(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.totalBytes -= entry['bytes']
+
+    def evict(self):
+        # Drop least recently used entries, but never the newest one since it is being handed out right now
+        while self.totalBytes > self.maxBytes and len(self.entries) > 1:
+            self.remove(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.totalBytes = 0
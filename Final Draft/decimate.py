@@ -0,0 +1,64 @@
+import numpy as np
+
+# Cuts a series down to about as many points as the screen can show. Both methods return indices
+# into the (sorted by x) input, so the same rows can be picked from any other column.
+decimationModes = ['LTTB', 'Min/Max', 'Full detail']
+
+
+def lttbIndices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point, and from every bucket in between
+    # the point that makes the biggest triangle with the previous pick and the next bucket's average
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    picked = 0
+
+    for i in range(threshold - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+        nextStart = edges[i + 1]
+        nextStop = edges[i + 2] if i + 2 < len(edges) else n
+        nextX = x[nextStart:nextStop].mean()
+        nextY = y[nextStart:nextStop].mean()
+
+        areas = np.abs((x[picked] - nextX) * (y[start:stop] - y[picked])
+                       - (x[picked] - x[start:stop]) * (nextY - y[picked]))
+        picked = start + int(areas.argmax())
+        indices[i + 1] = picked
+
+    return indices
+
+
+def minMaxIndices(y, buckets):
+    # The lowest and highest point of every bucket, so no peak is ever lost
+    n = len(y)
+    if buckets * 2 >= n or buckets < 1:
+        return np.arange(n)
+
+    # Split into equal sized buckets (the last one padded) and find the extremes of every row at once
+    size = -(-n // buckets)
+    rows = -(-n // size)
+    y = np.asarray(y, dtype='float64')
+    padded = np.full(rows * size, np.inf)
+    padded[:n] = y
+    lows = padded.reshape(rows, size).argmin(axis=1)
+    padded[n:] = -np.inf
+    highs = padded.reshape(rows, size).argmax(axis=1)
+
+    offsets = np.arange(rows) * size
+    return np.unique(np.concatenate([offsets + lows, offsets + highs]))
+
+
+def decimate(x, y, maxPoints, mode='LTTB'):
+    # Returns the indices to draw
+    if mode == 'LTTB':
+        return lttbIndices(x, y, maxPoints)
+    if mode == 'Min/Max':
+        return minMaxIndices(np.asarray(y), maxPoints // 2)
+    return np.arange(len(x))
@@ -0,0 +1,40 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sidecar import memorySavings, readCsv
+
+
+def timedRead(reader, path):
+    start = time.perf_counter()
+    try:
+        df = reader(path)
+        error = None
+    except Exception as e:
+        df, error = None, f"{type(e).__name__}: {e}"
+
+    return df, {'path': path, 'seconds': time.perf_counter() - start,
+                'rows': 0 if df is None else len(df), 'error': error,
+                'memory': memorySavings(path) if df is not None else None}
+
+
+def readFiles(paths, reader=readCsv, workers=None, useProcesses=False):
+    # Reads every file concurrently and returns (frames, report), both in the same order as paths.
+    # A file that fails to load shows up in the report with its error and is left out of frames,
+    # the rest of the batch still loads. workers=1 reads serially on the calling thread.
+    paths = list(paths)
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1) or 1
+
+    if workers == 1:
+        results = [timedRead(reader, path) for path in paths]
+    else:
+        # Threads work well here because the csv parser and np.load release the GIL,
+        # processes can be used instead when the reader does a lot of pure python work
+        poolType = ProcessPoolExecutor if useProcesses else ThreadPoolExecutor
+        with poolType(max_workers=workers) as pool:
+            results = list(pool.map(timedRead, [reader] * len(paths), paths))
+
+    frames = [df for df, fileReport in results if df is not None]
+    report = [fileReport for df, fileReport in results]
+    return frames, report
@@ -1,14 +1,24 @@
 import tkinter as tk
 import pypyodbc as odbc
 from credential import username, password
-from tkinter import simpledialog, messagebox
+from tkinter import simpledialog, messagebox, ttk
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib import style
+import numpy as np
 import pandas as pd
 import os
-from datetime import datetime, timedelta
-from tzlocal import get_localzone
+from datetime import datetime
+from dataset_cache import DatasetCache
+from catalog import DatasetCatalog
+from time_axis import clockToMs, hoursToMs, timeModes
+from decimate import decimationModes
+from plot_series import dataStreamNames, formatTime, graphTypes, overlayFor, seriesFor, visibleSlice
+from plot_artists import ArtistManager
+from render_scheduler import RenderScheduler
+from rolling import rollingOverlays, rollingWindows
+from background import BackgroundWorker
+from stream_panels import StreamPanels
 
 style.use("seaborn-darkgrid")
 style.use("dark_background")
@@ -22,18 +32,9 @@ class DataVisualizer:
         self.timeRange = None
         self.filename = None
 
-        self.clientNames = [
-            '20200118\\310',
-            '20200118\\311',
-            '20200118\\312',
-            '20200119\\310',
-            '20200119\\311',
-            '20200119\\312',
-            '20200120\\310',
-            '20200120\\312',
-            '20200121\\310',
-            '20200121\\312'
-        ]
+        # Clients come from the dataset catalog instead of a hard-coded list
+        self.catalog = DatasetCatalog(os.path.join(os.getcwd(), 'Dataset'))
+        self.clientNames = self.catalog.clientNames() or ["No clients found"]
 
         # Create window
         self.window = window
@@ -45,6 +46,25 @@ class DataVisualizer:
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.window)
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
+        # Plotted artists are kept and given new data instead of clearing the axes on every change
+        self.artists = ArtistManager(self.ax, self.canvas, formatter=self.formatTime)
+
+        # Zooming or panning with the toolbar or the mouse wheel changes the viewport (ms since midnight),
+        # and only that window of the data is fetched and decimated again
+        self.viewport = None
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.window, pack_toolbar=False)
+        self.toolbar.pack(side=tk.TOP, fill=tk.X)
+        self.ax.callbacks.connect('xlim_changed', self.onViewChanged)
+        self.canvas.mpl_connect('scroll_event', self.onScroll)
+
+        # UI changes ask for a render, quick bursts of changes are drawn once with the latest settings
+        self.renderScheduler = RenderScheduler(self.window, self.plotData)
+        self.comparisonScheduler = RenderScheduler(self.window, self.plotComparison)
+
+        # Loading, statistics and database work run here so the window never freezes
+        self.worker = BackgroundWorker(self.window)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
         """Buttons and Dropdown menus"""
         btnFrame = tk.Frame(master=window)
         btnFrame.pack(side=tk.BOTTOM)
@@ -53,6 +73,14 @@ class DataVisualizer:
         utcFrame = tk.Frame(master=window)
         utcFrame.pack(side=tk.BOTTOM)
 
+        # Shows what is loading in the background
+        statusFrame = tk.Frame(master=window)
+        statusFrame.pack(side=tk.BOTTOM)
+        self.statusLabel = tk.Label(master=statusFrame, text="")
+        self.statusLabel.pack(side=tk.LEFT)
+        self.progressBar = ttk.Progressbar(master=statusFrame, mode='indeterminate', length=150)
+        self.progressBar.pack(side=tk.LEFT)
+
         # Clear button
         clearBtn = tk.Button(master=btnFrame, text="Clear Data", command=self.clearData)
         clearBtn.pack(side=tk.LEFT)
@@ -64,6 +92,15 @@ class DataVisualizer:
         # Statistical Analysis Button
         statsBtn = tk.Button(master=btnFrame, text="Statistical Analysis", command=self.statsAnalysis)
         statsBtn.pack(side=tk.LEFT)
+        self.statsWindow = None
+        # Percentiles listed in the stats window besides the median and IQR, editable there
+        self.statsPercentiles = [5, 95]
+
+        # Compare streams button
+        compareBtn = tk.Button(master=btnFrame, text="Compare Streams", command=self.openComparison)
+        compareBtn.pack(side=tk.LEFT)
+        self.comparisonWindow = None
+        self.streamPanels = None
 
         # Connect Database button
         connectDbBtn = tk.Button(master=btnFrame, text="Connect to Database", command=self.connectDb)
@@ -81,7 +118,7 @@ class DataVisualizer:
         selectedClientVar.set(self.clientNames[0])  # Set the default selected client
 
         # Dropdown for graph type selection
-        self.graphTypes = ['Line', 'Bar', 'Scatter plot']
+        self.graphTypes = graphTypes
         selectedGraphTypeVar = tk.StringVar(self.window)
         selectedGraphTypeVar.set(self.graphTypes[0])  # Set the default graph type to 'Line'
         self.selectedGraphType = self.graphTypes[0]  # Initialize self.selectedGraphType
@@ -90,18 +127,53 @@ class DataVisualizer:
                                           command=self.onGraphTypeSelected)
         graphTypeDropdown.pack()
 
+        # Dropdown for how long series are thinned out before they are drawn
+        selectedDecimationVar = tk.StringVar(self.window)
+        selectedDecimationVar.set(decimationModes[0])  # LTTB by default
+        self.selectedDecimation = decimationModes[0]
+
+        decimationDropdown = tk.OptionMenu(self.window, selectedDecimationVar, *decimationModes,
+                                           command=self.onDecimationSelected)
+        decimationDropdown.pack()
+
+        # Dropdowns for a rolling window overlay and the length of its window
+        selectedOverlayVar = tk.StringVar(self.window)
+        selectedOverlayVar.set(rollingOverlays[0])  # No overlay by default
+        self.selectedOverlay = rollingOverlays[0]
+
+        overlayDropdown = tk.OptionMenu(self.window, selectedOverlayVar, *rollingOverlays,
+                                        command=self.onOverlaySelected)
+        overlayDropdown.pack()
+
+        selectedRollingWindowVar = tk.StringVar(self.window)
+        selectedRollingWindowVar.set('15 min')
+        self.selectedRollingWindow = '15 min'
+
+        rollingWindowDropdown = tk.OptionMenu(self.window, selectedRollingWindowVar, *rollingWindows,
+                                              command=self.onRollingWindowSelected)
+        rollingWindowDropdown.pack()
+
         # Dropdown for data stream selection
-        self.dataStreamNames = ['Eda avg', 'Acc magnitude avg', 'Temp avg', 'Movement intensity', 'Steps count',
-                                'Rest', 'On Wrist']
+        self.dataStreamNames = dataStreamNames
         selectedDataStreamVar = tk.StringVar(self.window)
         selectedDataStreamVar.set(self.dataStreamNames[0])  # Set the default selected data stream
         self.selectedDataStream = self.dataStreamNames[0]  # Initialize self.selectedDataStream
 
-        # Boolean for UTC checkbox
-        self.utcVar = tk.BooleanVar()
-        self.utcCheckbox = tk.Checkbutton(self.window, text="Convert to UTC", variable=self.utcVar)
-        self.utcCheckbox.pack()
-        self.utcVar.trace('w', self.onUtcChanged)
+        # Decoded files are kept here so view changes don't re-read summary.csv
+        self.datasetCache = DatasetCache(self.dataStreamNames)
+
+        # Streams shown side by side in the comparison window
+        self.comparedStreamVars = {stream: tk.BooleanVar(self.window, value=stream in self.dataStreamNames[:3])
+                                   for stream in self.dataStreamNames}
+        for streamVar in self.comparedStreamVars.values():
+            streamVar.trace('w', self.comparisonScheduler.request)
+
+        # Dropdown for the time zone the x-axis is shown in
+        self.timeModeVar = tk.StringVar(self.window)
+        self.timeModeVar.set(timeModes[0])  # Viewer local time by default
+        self.timeModeDropdown = tk.OptionMenu(self.window, self.timeModeVar, *timeModes)
+        self.timeModeDropdown.pack()
+        self.timeModeVar.trace('w', self.onTimeModeChanged)
 
         """Buttons and Dropdown menus end here"""
 
@@ -109,7 +181,7 @@ class DataVisualizer:
 
         def onDataStreamSelected(*args):
             self.selectedDataStream = selectedDataStreamVar.get()  # Get the selected data stream
-            self.plotData()
+            self.resetView()
 
         selectedDataStreamVar.trace('w', onDataStreamSelected)
 
@@ -118,48 +190,115 @@ class DataVisualizer:
 
         def onClientSelected(*args):
             selectedClient = selectedClientVar.get()  # Get the selected client
-            folderPath = os.path.join(os.getcwd(), 'Dataset', selectedClient)
-            filePath = os.path.join(folderPath, 'summary.csv')
+            entry = self.catalog.getFile(selectedClient)
 
-            if os.path.exists(filePath):
-                self.filename = filePath
-                self.plotData()
+            if entry is not None:
+                self.filename = self.catalog.path(entry)
+                self.resetView()
             else:
-                messagebox.showerror("File Not Found", f"The file {filePath} does not exist.")
+                messagebox.showerror("File Not Found", f"No summary.csv was found for {selectedClient}.")
 
         selectedClientVar.trace('w', onClientSelected)
 
         self.clientDropdown = tk.OptionMenu(self.window, selectedClientVar, *self.clientNames)
         self.clientDropdown.pack()
 
-    def onUtcChanged(self,*args):
-        self.plotData()
+    def onTimeModeChanged(self, *args):
+        self.resetView()
+
+    def resetView(self):
+        # New data is shown whole again, and the toolbar's back/forward history no longer applies
+        self.viewport = None
+        self.toolbar.update()
+        self.renderScheduler.request()
+
+    def onViewChanged(self, ax):
+        # Limits set by the artist manager for a new plot are not a viewport change
+        if self.artists.updatingLimits or self.df.empty:
+            return
+        start, end = hoursToMs(ax.get_xlim())
+        self.viewport = (int(start), int(end))
+        self.renderScheduler.request()
+
+    def onScroll(self, event):
+        # Wheel up zooms in around the cursor, wheel down zooms out
+        if event.inaxes is not self.ax or event.xdata is None:
+            return
+        factor = 1 / 1.25 if event.button == 'up' else 1.25
+        left, right = self.ax.get_xlim()
+        self.ax.set_xlim(event.xdata - (event.xdata - left) * factor, event.xdata + (right - event.xdata) * factor)
+        self.canvas.draw_idle()
+
+    def visibleRange(self):
+        # The range to fetch: the viewport plus half a window either side, so short pans already have data,
+        # kept inside the time range entered in the dialog
+        if self.viewport is None:
+            return self.timeRange
+
+        start, end = self.viewport
+        padding = (end - start) // 2
+        start, end = start - padding, end + padding
+        if self.timeRange:
+            start, end = max(start, self.timeRange[0]), min(end, self.timeRange[1])
+        return start, end
 
     def formatTime(self, x, *args):
-        h = int(x)
-        m = int((x * 60) % 60)
-        s = int((x * 3600) % 60)
-        return f"{h:02d}:{m:02d}:{s:02d}"
+        return formatTime(x)
 
     def onGraphTypeSelected(self, selectedGraphType):
         self.selectedGraphType = selectedGraphType
-        self.plotData()
+        self.renderScheduler.request()
+
+    def onDecimationSelected(self, selectedDecimation):
+        self.selectedDecimation = selectedDecimation
+        self.renderScheduler.request()
+
+    def onOverlaySelected(self, selectedOverlay):
+        self.selectedOverlay = selectedOverlay
+        self.renderScheduler.request()
+
+    def onRollingWindowSelected(self, selectedRollingWindow):
+        self.selectedRollingWindow = selectedRollingWindow
+        if self.selectedOverlay != 'Off':
+            self.renderScheduler.request()
+
+    def close(self):
+        # Background work is stopped first, so no result arrives for widgets that are gone
+        self.renderScheduler.cancel()
+        self.comparisonScheduler.cancel()
+        self.worker.shutdown()
+        self.window.destroy()
 
     def clearData(self):
-        self.ax.clear()
-        self.canvas.draw()
+        self.renderScheduler.cancel()
+        self.worker.cancel('plot')
+        self.comparisonScheduler.cancel()
+        self.worker.cancel('compare')
+        if self.streamPanels is not None:
+            self.streamPanels.show(self.selectedGraphType, {})
+        self.hideLoading()
+        self.artists.clear()
         self.df = pd.DataFrame()
         self.timeRange = None
+        self.viewport = None
+        self.toolbar.update()
+
+    def connectDb(self):
+        # Connecting can take a while on a slow network, so it happens on a worker thread
+        self.worker.submit('database', self.openConnection, onDone=print, onError=self.onDatabaseError)
 
     @staticmethod
-    def connectDb():
+    def openConnection(job):
         server = 'cse535.database.windows.net'
         database = 'ProjectDB'
         driver = '{ODBC Driver 18 for SQL Server}'
         connectionString = ('DRIVER=' + driver + ';SERVER=tcp:' + server + ';PORT=1433;DATABASE=' + database + ';UID=' + username + ';PWD=' + password )
 
-        odbc.connect(connectionString)
-        print(odbc.connect(connectionString))
+        return odbc.connect(connectionString)
+
+    @staticmethod
+    def onDatabaseError(error):
+        messagebox.showerror("Database Error", f"Could not connect to the database: {error}")
 
     def onQuerySelect(self):
         return
@@ -175,13 +314,14 @@ class DataVisualizer:
             start = datetime.strptime(startStr, "%H:%M:%S").time()
             end = datetime.strptime(endStr, "%H:%M:%S").time()
 
-            start = timedelta(hours=start.hour, minutes=start.minute, seconds=start.second)
-            end = timedelta(hours=end.hour, minutes=end.minute, seconds=end.second)
+            # The time axis is milliseconds since midnight
+            start = clockToMs(start.hour, start.minute, start.second)
+            end = clockToMs(end.hour, end.minute, end.second)
 
             # Plot data with the new time range
             if start is not None and end is not None and start < end:
                 self.timeRange = (start, end)
-                self.plotData()
+                self.resetView()
             else:
                 messagebox.showerror("Invalid Time Range", "Start time must be less than end time.")
         except ValueError:
@@ -192,86 +332,234 @@ class DataVisualizer:
             messagebox.showerror("No Data", "Please load data first.")
             return
 
-        # Create a new window
+        # The stats cover what is on screen: the zoomed window if there is one, else the entered time range
+        statsRange = self.timeRange
+        if self.viewport is not None:
+            statsRange = self.viewport
+            if self.timeRange:
+                statsRange = (max(statsRange[0], self.timeRange[0]), min(statsRange[1], self.timeRange[1]))
+
+        # The selected stream first, then the ones ticked in an open comparison window, all in one pass
+        columns = [self.selectedDataStream]
+        if self.comparisonWindow is not None:
+            columns += [stream for stream, streamVar in self.comparedStreamVars.items()
+                        if streamVar.get() and stream not in columns]
+
+        percentiles = sorted(set([25, 50, 75] + self.statsPercentiles))
+        self.worker.submit('stats', self.computeStats, self.filename, self.timeModeVar.get(), columns, statsRange,
+                           percentiles, onDone=self.showStats, onError=self.onLoadError)
+
+    def computeStats(self, job, filename, timeMode, columns, timeRange, percentiles):
+        # Count, mean, std. dev, min and max of any window come straight from the view's range index.
+        # Percentiles of the whole file are merged from its per-day quantile sketches, those of a time
+        # window are taken from its rows, which are one slice since views are sorted on TimeOfDayMs.
+        df = self.datasetCache.getView(filename, timeMode)
+        index = self.datasetCache.getIndex(filename, timeMode)
+        sketches = self.datasetCache.getSketches(filename)
+        rows = visibleSlice(df['TimeOfDayMs'].to_numpy(), timeRange)
+
+        results = []
+        for column in columns:
+            if job.cancelled():
+                return None
+            stats = index.stats(column, timeRange)
+            if not stats['count']:
+                values = [np.nan] * len(percentiles)
+            elif timeRange is None:
+                values = sketches.merged(column).quantile(np.array(percentiles) / 100).tolist()
+            else:
+                values = np.nanpercentile(df[column].to_numpy(dtype='float64')[rows], percentiles).tolist()
+            stats['percentiles'] = dict(zip(percentiles, values))
+            stats['median'] = stats['percentiles'][50]
+            results.append((column, stats))
+        return results
+
+    def showStats(self, results):
+        if results is None:
+            return
+
+        # Create a new window, replacing the one of an earlier request
+        if self.statsWindow is not None:
+            self.statsWindow.destroy()
         statsWindow = tk.Toplevel(self.window)
         statsWindow.title("Statistical Analysis")
+        self.statsWindow = statsWindow
 
-        # Compute and display the basic statistics for the columns
-        for column in [self.selectedDataStream]:
-            stats = self.df[column].describe()
+        # Display the basic statistics for the columns
+        for column, stats in results:
+            percentiles = stats['percentiles']
             statsStr = f"{column}:" \
                        f"\nMean: {stats['mean']}" \
-                       f"\nMedian: {self.df[column].median()}" \
+                       f"\nMedian: {stats['median']}" \
+                       f"\nIQR: {percentiles[75] - percentiles[25]}" \
                        f"\nStd. dev: {stats['std']}" \
                        f"\nMin: {stats['min']}" \
                        f"\nMax: {stats['max']}"
+            for percentile in self.statsPercentiles:
+                statsStr += f"\nP{percentile:g}: {percentiles.get(percentile, np.nan)}"
 
             label = tk.Label(master=statsWindow, text=statsStr, justify=tk.LEFT)
             label.pack()
 
-    def plotData(self):
-        if self.filename is None:
-            messagebox.showerror("No File Selected", "Please select a CSV file.")
+        # Any other percentiles can be typed in, e.g. "1, 10, 90, 99"
+        percentileFrame = tk.Frame(master=statsWindow)
+        percentileFrame.pack()
+        tk.Label(master=percentileFrame, text="Percentiles:").pack(side=tk.LEFT)
+        percentileEntry = tk.Entry(master=percentileFrame)
+        percentileEntry.insert(0, ', '.join(f"{percentile:g}" for percentile in self.statsPercentiles))
+        percentileEntry.pack(side=tk.LEFT)
+        applyBtn = tk.Button(master=percentileFrame, text="Apply",
+                             command=lambda: self.setStatsPercentiles(percentileEntry.get()))
+        applyBtn.pack(side=tk.LEFT)
+
+    def setStatsPercentiles(self, text):
+        try:
+            percentiles = [float(part) for part in text.replace(',', ' ').split()]
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Percentiles must be numbers between 0 and 100.")
             return
-
-        if not os.path.isfile(self.filename):
-            messagebox.showerror("File Not Found", f"The selected file '{self.filename}' does not exist.")
+        if not all(0 <= percentile <= 100 for percentile in percentiles):
+            messagebox.showerror("Invalid Input", "Percentiles must be numbers between 0 and 100.")
             return
 
-        try:
-            self.df = pd.read_csv(self.filename, usecols=self.dataStreamNames + ['Unix Timestamp (UTC)'])
-            self.df['Datetime'] = pd.to_datetime(self.df['Unix Timestamp (UTC)'], unit='ms')
+        self.statsPercentiles = percentiles
+        self.statsAnalysis()
 
-            if self.utcVar.get():
-                # Convert to UTC if necessary
-                self.df['Datetime'] = self.df['Datetime'].dt.tz_localize('UTC')
-            else:
-                # Convert to local time if necessary
-                localTz = get_localzone()
-                self.df['Datetime'] = self.df['Datetime'].dt.tz_localize('UTC').dt.tz_convert(localTz)
+    def showLoading(self, text):
+        self.statusLabel.config(text=text)
+        self.progressBar.start(10)
 
-            self.df['Minute'] = self.df['Datetime'].dt.minute + self.df['Datetime'].dt.hour * 60 + self.df[
-                'Datetime'].dt.second / 60
+    def hideLoading(self):
+        self.progressBar.stop()
+        self.statusLabel.config(text="")
 
-            # Convert 'Minute' column to hours:minutes:seconds format
-            self.df['Minute'] = pd.to_timedelta(self.df['Minute'], unit='m')
+    def showLoadingProgress(self, stream, rows, partial=None):
+        # Big files are read in chunks, so show how far along the load is, and the stream's stats over the
+        # rows read so far, before the plot is ready
+        text = f"Loading {stream}... {rows} rows"
+        if partial is not None and partial['count']:
+            text += f", mean {partial['mean']:.4g}, min {partial['min']:.4g}, max {partial['max']:.4g}"
+        self.statusLabel.config(text=text)
 
-            # Drop rows with missing data
-            self.df.dropna(inplace=True)
-
-            # Sort data by 'Minute' column
-            self.df.sort_values('Minute', inplace=True)
+    @staticmethod
+    def loadProgress(job, label, stream=None):
+        # onChunk callback for the dataset cache: reports the rows read so far (and the partial stats of
+        # stream), and stops reading once a newer job has replaced this one
+        def onChunk(partial, rows):
+            job.raiseIfCancelled()
+            job.progress(label, rows, None if stream is None else partial.summary(stream))
+        return onChunk
+
+    def prepareSeries(self, job, filename, timeMode, stream, graphType, decimation, timeRange, maxPoints, overlay,
+                      rollingWindow):
+        # Runs on a worker thread: everything from reading the file to the decimated points that get drawn
+        # Decoded, timezone-converted and sorted data comes from the cache unless the file changed
+        df = self.datasetCache.getView(filename, timeMode, onChunk=self.loadProgress(job, stream, stream))
+        xValues, yValues = seriesFor(df, self.datasetCache.getPyramid(filename), timeMode, stream, graphType,
+                                     decimation, timeRange, maxPoints, self.datasetCache.getIndex(filename, timeMode))
+
+        # The rolling stats are cached per (file, stream, window), so only the first overlay pays for them
+        overlaySeries = None
+        if overlay != 'Off':
+            rolling = self.datasetCache.getRolling(filename, stream, rollingWindows[rollingWindow], timeMode)
+            overlaySeries = overlayFor(df, rolling, overlay, timeRange, maxPoints) + (f"{rollingWindow} {overlay}",)
+        return df, graphType, stream, xValues, yValues, overlaySeries
+
+    def drawData(self, result):
+        self.hideLoading()
+        self.df, graphType, stream, xValues, yValues, overlaySeries = result
+        self.artists.show(graphType, xValues, yValues, stream, keepLimits=self.viewport is not None)
+        if overlaySeries is None:
+            self.artists.clearOverlay()
+        else:
+            self.artists.showOverlay(*overlaySeries)
+
+    def openComparison(self):
+        if self.comparisonWindow is not None:
+            self.plotComparison()
+            return
 
-            self.ax.clear()
+        self.comparisonWindow = tk.Toplevel(self.window)
+        self.comparisonWindow.title("Compare Streams")
+        self.comparisonWindow.protocol("WM_DELETE_WINDOW", self.closeComparison)
+
+        fig = Figure(figsize=(10, 8), dpi=100)
+        canvas = FigureCanvasTkAgg(fig, master=self.comparisonWindow)
+        # The panels share their x axis, so zooming or panning one with the toolbar moves all of them
+        toolbar = NavigationToolbar2Tk(canvas, self.comparisonWindow, pack_toolbar=False)
+        toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        streamFrame = tk.Frame(master=self.comparisonWindow)
+        streamFrame.pack(side=tk.BOTTOM)
+        for stream, streamVar in self.comparedStreamVars.items():
+            streamCheckbox = tk.Checkbutton(streamFrame, text=stream, variable=streamVar)
+            streamCheckbox.pack(side=tk.LEFT)
+
+        canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.streamPanels = StreamPanels(fig, canvas, formatter=self.formatTime)
+        self.plotComparison()
+
+    def closeComparison(self):
+        self.worker.cancel('compare')
+        self.comparisonScheduler.cancel()
+        self.comparisonWindow.destroy()
+        self.comparisonWindow = None
+        self.streamPanels = None
+
+    def plotComparison(self):
+        if self.streamPanels is None or self.filename is None or not os.path.isfile(self.filename):
+            return
 
-            if self.timeRange:
-                start, end = self.timeRange
-                dfRange = self.df[(self.df['Minute'] >= start) & (self.df['Minute'] <= end)]
-            else:
-                dfRange = self.df
+        streams = [stream for stream, streamVar in self.comparedStreamVars.items() if streamVar.get()]
+        maxPoints = max(2 * int(self.ax.bbox.width), 100)
+        self.worker.submit('compare', self.prepareComparison, self.filename, self.timeModeVar.get(), streams,
+                           self.selectedGraphType, self.selectedDecimation, self.timeRange, maxPoints,
+                           onDone=self.drawComparison, onError=self.onLoadError, onProgress=self.showLoadingProgress)
+
+    def prepareComparison(self, job, filename, timeMode, streams, graphType, decimation, timeRange, maxPoints):
+        # One decode (usually a cache hit) feeds every panel
+        df = self.datasetCache.getView(filename, timeMode, onChunk=self.loadProgress(job, ', '.join(streams)))
+        pyramid = self.datasetCache.getPyramid(filename)
+        index = self.datasetCache.getIndex(filename, timeMode)
+        series = {stream: seriesFor(df, pyramid, timeMode, stream, graphType, decimation, timeRange, maxPoints, index)
+                  for stream in streams}
+        return graphType, series
+
+    def drawComparison(self, result):
+        if self.streamPanels is not None:
+            self.streamPanels.show(*result)
+
+    def onLoadError(self, error):
+        self.hideLoading()
+        if isinstance(error, pd.errors.EmptyDataError):
+            messagebox.showerror("Empty File", "File is empty.")
+        elif isinstance(error, pd.errors.ParserError):
+            messagebox.showerror("Invalid File", "File is not a valid CSV file.")
+        else:
+            messagebox.showerror("Error", f"{type(error).__name__}: {error}")
 
-            xValues = dfRange['Minute'].dt.total_seconds() / 3600
-            yValues = dfRange[self.selectedDataStream]
+    def plotData(self):
+        if self.filename is None:
+            messagebox.showerror("No File Selected", "Please select a CSV file.")
+            return
 
-            if self.selectedGraphType == 'Line':
-                self.ax.plot(xValues, yValues, label=self.selectedDataStream, color='plum')
-            elif self.selectedGraphType == 'Bar':
-                self.ax.bar(xValues, yValues, label=self.selectedDataStream, color='plum')
-            elif self.selectedGraphType == 'Scatter plot':
-                self.ax.scatter(xValues, yValues, label=self.selectedDataStream, color='plum')
+        if not os.path.isfile(self.filename):
+            messagebox.showerror("File Not Found", f"The selected file '{self.filename}' does not exist.")
+            return
 
-            self.ax.set_title(f'{self.selectedDataStream} Over Time', fontweight='bold', color='cornflowerblue')
-            self.ax.set_xlabel('Time', fontweight='bold', color='cornflowerblue')
-            self.ax.set_ylabel(self.selectedDataStream, fontweight='bold', color='cornflowerblue')
-            self.ax.xaxis.set_major_formatter(self.formatTime)
+        # Draw about two points per pixel of the plot area, whatever the length of the visible range.
+        # A zoomed in view fetches twice its width, so it gets twice the points.
+        maxPoints = max(2 * int(self.ax.bbox.width), 100) * (1 if self.viewport is None else 2)
 
-            self.ax.legend()
-            self.canvas.draw()
+        # The load runs in the background and replaces any load that is still going
+        self.showLoading(f"Loading {self.selectedDataStream}...")
+        self.worker.submit('plot', self.prepareSeries, self.filename, self.timeModeVar.get(), self.selectedDataStream,
+                           self.selectedGraphType, self.selectedDecimation, self.visibleRange(), maxPoints,
+                           self.selectedOverlay, self.selectedRollingWindow, onDone=self.drawData,
+                           onError=self.onLoadError, onProgress=self.showLoadingProgress)
 
-        except pd.errors.EmptyDataError:
-            messagebox.showerror("Empty File", "File is empty.")
-        except pd.errors.ParserError:
-            messagebox.showerror("Invalid File", "File is not a valid CSV file.")
+        # An open comparison window follows the same file, time mode, range and graph type
+        self.plotComparison()
 
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ import os
 import pytz
 from datetime import datetime, timedelta
 from tzlocal import get_localzone
+from sidecar import readCsv
 
 
 # Apply custom style
@@ -172,7 +173,7 @@ class DataVisualizer:
             return
 
         try:
-            self.df = pd.read_csv(self.filename, usecols=self.data_stream_names + ['Unix Timestamp (UTC)'])
+            self.df = readCsv(self.filename, usecols=self.data_stream_names + ['Unix Timestamp (UTC)'])
             self.df['Datetime'] = pd.to_datetime(self.df['Unix Timestamp (UTC)'], unit='ms')
 
             if self.utc_var.get():
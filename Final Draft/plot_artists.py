@@ -0,0 +1,252 @@
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+# Bars are at most this wide in x units (hours), the same as ax.bar's default. Closer bars are narrowed
+# to the gap between them so they don't overlap.
+barWidth = 0.8
+# Rolling window overlays are drawn in this colour, their band with this opacity
+overlayColor = 'gold'
+bandAlpha = 0.25
+
+
+class ArtistManager:
+    # Owns the artists of one plot. The line, scatter and bar artists are created the first time they are
+    # needed and then only get new data, so switching streams, ranges or graph types doesn't clear the axes
+    # and rebuild the title, labels, formatter and legend every time. Redraws go through draw_idle.
+
+    def __init__(self, ax, canvas, color='plum', textColor='cornflowerblue', formatter=None, showTitle=True,
+                 showXLabel=True):
+        self.ax = ax
+        self.canvas = canvas
+        self.color = color
+        self.textColor = textColor
+        self.formatter = formatter
+        # Stacked panels only label the bottom x axis and leave the stream name to the y label
+        self.showTitle = showTitle
+        self.showXLabel = showXLabel
+
+        self.line = None
+        self.scatter = None
+        self.bars = None
+        self.barWidth = barWidth
+        self.graphType = None
+        self.label = None
+        self.legendLabel = None
+
+        # Rolling window overlay: a line and a band on the same axes, or a z-score line on an axis of its own
+        self.overlayLine = None
+        self.overlayBand = None
+        self.zscoreAxes = None
+        self.zscoreLine = None
+        self.overlayArtist = None
+        self.overlayLabel = None
+        # True while the manager itself moves the axis limits, so xlim_changed listeners can tell
+        # a new plot apart from the user zooming or panning
+        self.updatingLimits = False
+        self.setupAxes()
+
+    def setupAxes(self):
+        # Decorations that stay the same for every plot
+        if self.showXLabel:
+            self.ax.set_xlabel('Time', fontweight='bold', color=self.textColor)
+        if self.formatter is not None:
+            self.ax.xaxis.set_major_formatter(self.formatter)
+
+    def setTitle(self, title):
+        if self.ax.get_title() != title:
+            self.ax.set_title(title, fontweight='bold', color=self.textColor)
+
+    def updateLine(self, x, y, label):
+        if self.line is None:
+            self.line, = self.ax.plot(x, y, label=label, color=self.color)
+        else:
+            self.line.set_data(x, y)
+        return self.line
+
+    def updateScatter(self, x, y, label):
+        offsets = np.column_stack([x, y])
+        if self.scatter is None:
+            self.scatter = self.ax.scatter(x, y, label=label, color=self.color)
+        else:
+            self.scatter.set_offsets(offsets)
+        return self.scatter
+
+    def barBuckets(self, x, y):
+        # Bars narrower than a pixel can't be told apart, so neighbouring bars that land in the same pixel
+        # column are merged into one that keeps the value furthest from zero. x has to be sorted.
+        pixels = max(int(self.ax.bbox.width), 1)
+        if len(x) <= pixels or x[-1] <= x[0]:
+            return x, y
+
+        columns = ((x - x[0]) * (pixels / (x[-1] - x[0]))).astype('int64')
+        starts = np.flatnonzero(np.diff(columns, prepend=-1))
+        magnitude = np.abs(y)
+        # Index of the largest |y| in each bucket: sort by (bucket, |y|) and take each bucket's last row
+        order = np.lexsort((magnitude, columns))
+        ends = np.append(starts[1:], len(x)) - 1
+        keep = order[ends]
+        return x[starts], y[keep]
+
+    @staticmethod
+    def barVertices(x, y, width):
+        # One closed rectangle per bar, all drawn by a single PolyCollection
+        left, right = x - width / 2, x + width / 2
+        zeros = np.zeros_like(y)
+        return np.stack([np.column_stack([left, zeros]), np.column_stack([left, y]),
+                         np.column_stack([right, y]), np.column_stack([right, zeros])], axis=1)
+
+    def updateBars(self, x, y, label):
+        present = ~np.isnan(y)
+        x, y = self.barBuckets(x[present], y[present])
+
+        gaps = np.diff(x)
+        gaps = gaps[gaps > 0]
+        self.barWidth = min(barWidth, float(np.median(gaps))) if len(gaps) else barWidth
+
+        vertices = self.barVertices(x, y, self.barWidth)
+        if self.bars is None:
+            self.bars = PolyCollection(vertices, facecolors=self.color, edgecolors='none', label=label)
+            self.ax.add_collection(self.bars)
+        else:
+            self.bars.set_verts(vertices)
+        return self.bars
+
+    def artistFor(self, graphType):
+        return {'Line': self.line, 'Bar': self.bars, 'Scatter plot': self.scatter}.get(graphType)
+
+    @staticmethod
+    def setVisible(artist, visible):
+        if artist is not None:
+            artist.set_visible(visible)
+
+    def updateLimits(self, x, y, graphType):
+        # relim() ignores collections, so the limits are worked out from the data with the default 5% margins
+        if len(x) == 0 or np.isnan(y).all():
+            return
+        xMin, xMax = float(np.min(x)), float(np.max(x))
+        yMin, yMax = float(np.nanmin(y)), float(np.nanmax(y))
+        if graphType == 'Bar':
+            xMin, xMax = xMin - self.barWidth / 2, xMax + self.barWidth / 2
+            yMin, yMax = min(yMin, 0.0), max(yMax, 0.0)
+
+        xPad = (xMax - xMin) * 0.05 or 0.5
+        yPad = (yMax - yMin) * 0.05 or 0.5
+        self.updatingLimits = True
+        try:
+            self.ax.set_xlim(xMin - xPad, xMax + xPad)
+            self.ax.set_ylim(yMin - yPad, yMax + yPad)
+        finally:
+            self.updatingLimits = False
+
+    def show(self, graphType, x, y, label, keepLimits=False):
+        # keepLimits leaves the axis limits alone, for data fetched for a window the user zoomed or panned to
+        x = np.asarray(x, dtype='float64')
+        y = np.asarray(y, dtype='float64')
+
+        updaters = {'Line': self.updateLine, 'Bar': self.updateBars, 'Scatter plot': self.updateScatter}
+        if graphType not in updaters:
+            return
+        for otherType in updaters:
+            if otherType != graphType:
+                self.setVisible(self.artistFor(otherType), False)
+
+        artist = updaters[graphType](x, y, label)
+        self.setVisible(artist, True)
+
+        if self.showTitle:
+            self.setTitle(f'{label} Over Time')
+        self.ax.set_ylabel(label, fontweight='bold', color=self.textColor)
+        if not keepLimits:
+            self.updateLimits(x, y, graphType)
+
+        self.graphType, self.label = graphType, label
+        artist.set_label(label)
+        self.updateLegend()
+        self.redraw()
+
+    def updateLegend(self):
+        # The legend only has to be rebuilt when what it shows changes
+        artist = self.artistFor(self.graphType)
+        if artist is None or self.legendLabel == (self.graphType, self.label, self.overlayLabel):
+            return
+
+        handles, labels = [artist], [self.label]
+        if self.overlayArtist is not None:
+            handles.append(self.overlayArtist)
+            labels.append(self.overlayLabel)
+        # A fixed corner, loc='best' tests every bar and point against the legend on each draw
+        self.ax.legend(handles=handles, labels=labels, loc='upper right')
+        self.legendLabel = (self.graphType, self.label, self.overlayLabel)
+
+    @staticmethod
+    def updateOverlayLine(ax, line, x, y):
+        if line is None:
+            line, = ax.plot(x, y, color=overlayColor, linewidth=1)
+        else:
+            line.set_data(x, y)
+        line.set_visible(True)
+        return line
+
+    def showOverlay(self, x, centre, low, high, label):
+        # A rolling window series over the plot. Without low and high (the z-score) it is on another scale
+        # than the data, so it gets a y axis of its own on the right.
+        if self.overlayBand is not None:
+            self.overlayBand.remove()
+            self.overlayBand = None
+
+        if low is None:
+            if self.zscoreAxes is None:
+                self.zscoreAxes = self.ax.twinx()
+                self.zscoreAxes.set_ylabel('Z-score', fontweight='bold', color=overlayColor)
+            self.zscoreAxes.set_visible(True)
+            self.setVisible(self.overlayLine, False)
+            self.zscoreLine = self.updateOverlayLine(self.zscoreAxes, self.zscoreLine, x, centre)
+            self.zscoreAxes.relim()
+            self.zscoreAxes.autoscale_view(scalex=False)
+            self.overlayArtist = self.zscoreLine
+        else:
+            if self.zscoreAxes is not None:
+                self.zscoreAxes.set_visible(False)
+            self.overlayLine = self.updateOverlayLine(self.ax, self.overlayLine, x, centre)
+            self.overlayBand = self.ax.fill_between(x, low, high, color=overlayColor, alpha=bandAlpha, linewidth=0)
+            self.overlayArtist = self.overlayLine
+
+        self.overlayLabel = label
+        self.updateLegend()
+        self.redraw()
+
+    def clearOverlay(self):
+        if self.overlayArtist is None:
+            return
+
+        self.setVisible(self.overlayLine, False)
+        if self.zscoreAxes is not None:
+            self.zscoreAxes.set_visible(False)
+        if self.overlayBand is not None:
+            self.overlayBand.remove()
+            self.overlayBand = None
+        self.overlayArtist = self.overlayLabel = None
+        self.updateLegend()
+        self.redraw()
+
+    def redraw(self):
+        # Without a canvas (headless rendering) the figure is only drawn when it is saved
+        if self.canvas is not None:
+            self.canvas.draw_idle()
+
+    def clear(self):
+        for artist in [self.line, self.scatter, self.bars, self.overlayLine, self.overlayBand, self.zscoreLine]:
+            if artist is not None:
+                artist.remove()
+        self.line = self.scatter = self.bars = None
+        self.overlayLine = self.overlayBand = self.zscoreLine = self.overlayArtist = None
+        if self.zscoreAxes is not None:
+            self.zscoreAxes.set_visible(False)
+        self.graphType = self.label = self.legendLabel = self.overlayLabel = None
+
+        legend = self.ax.get_legend()
+        if legend is not None:
+            legend.remove()
+        self.ax.set_title('')
+        self.ax.set_ylabel('')
+        self.redraw()
@@ -0,0 +1,84 @@
+import numpy as np
+
+from decimate import decimate
+from pyramid import pyramidLevels
+from rolling import overlaySeries
+from time_axis import msToHours
+
+# Streams and chart types every front end offers
+dataStreamNames = ['Eda avg', 'Acc magnitude avg', 'Temp avg', 'Movement intensity', 'Steps count', 'Rest', 'On Wrist']
+graphTypes = ['Line', 'Bar', 'Scatter plot']
+
+
+def formatTime(x, *args):
+    # Tick label for an x value in hours since midnight
+    h = int(x)
+    m = int((x * 60) % 60)
+    s = int((x * 3600) % 60)
+    return f"{h:02d}:{m:02d}:{s:02d}"
+
+
+def visibleSlice(timeOfDayMs, timeRange):
+    # Rows of a sorted time axis inside [start, end], found by binary search instead of a mask over every row
+    if not timeRange:
+        return slice(0, len(timeOfDayMs))
+    start, end = timeRange
+    return slice(int(np.searchsorted(timeOfDayMs, start, side='left')),
+                 int(np.searchsorted(timeOfDayMs, end, side='right')))
+
+
+def pyramidSeries(pyramid, level, timeMode, stream, graphType, timeRange):
+    # (time of day in ms, values) for one stream at one pyramid level. Lines go through
+    # each bucket's min and max so peaks stay visible, bars and scatter plots use the bucket mean.
+    timeOfDayMs, order = pyramid.timeOfDay(level, timeMode)
+    rows = visibleSlice(timeOfDayMs, timeRange)
+    timeOfDayMs, order = timeOfDayMs[rows], order[rows]
+    stats = {stat: values[order] for stat, values in pyramid.levels[level][stream].items()}
+
+    keep = stats['count'] > 0
+    timeOfDayMs = timeOfDayMs[keep]
+
+    if graphType == 'Line':
+        return timeOfDayMs.repeat(2), np.column_stack([stats['min'][keep], stats['max'][keep]]).ravel()
+    return timeOfDayMs, stats['mean'][keep]
+
+
+def seriesFor(view, pyramid, timeMode, stream, graphType, decimation, timeRange, maxPoints, index=None):
+    # (x in hours, y) that get drawn for one stream of a view from DatasetCache.getView.
+    # index is the view's RangeIndex, which lets Min/Max decimation skip the raw rows.
+    # Views are sorted on TimeOfDayMs, so the visible rows are one contiguous slice
+    allTimeOfDayMs = view['TimeOfDayMs'].to_numpy()
+    rows = visibleSlice(allTimeOfDayMs, timeRange)
+    timeOfDayMs, yValues = allTimeOfDayMs[rows], view[stream].to_numpy()[rows]
+
+    # Long ranges are drawn from the coarsest pyramid level that still has a bucket per pixel,
+    # so the raw rows don't have to be thinned out again on every redraw
+    level = None
+    if len(timeOfDayMs) > maxPoints and decimation != 'Full detail':
+        level = pyramid.chooseLevel(timeMode, maxPoints // 2, timeRange)
+
+    if level is not None and level != pyramidLevels[0][0]:
+        timeOfDayMs, yValues = pyramidSeries(pyramid, level, timeMode, stream, graphType, timeRange)
+    elif decimation == 'Min/Max' and index is not None:
+        # The extremes of every bucket come from the index's sparse tables
+        keep = index.minMaxRows(stream, rows.start, rows.stop, maxPoints // 2)
+        timeOfDayMs, yValues = allTimeOfDayMs[keep], view[stream].to_numpy()[keep]
+    else:
+        keep = decimate(timeOfDayMs, yValues, maxPoints, decimation)
+        timeOfDayMs, yValues = timeOfDayMs[keep], yValues[keep]
+
+    return msToHours(timeOfDayMs), yValues
+
+
+def overlayFor(view, rolling, overlay, timeRange, maxPoints):
+    # (x in hours, centre, low, high) of a rolling window overlay for the rows of a view that are in range.
+    # Rolling stats are smooth on the scale of a pixel, so evenly spaced rows are enough to draw them.
+    timeOfDayMs = view['TimeOfDayMs'].to_numpy()
+    rows = visibleSlice(timeOfDayMs, timeRange)
+    keep = np.arange(rows.start, rows.stop)
+    if len(keep) > maxPoints:
+        keep = np.unique(np.linspace(rows.start, rows.stop - 1, maxPoints).astype('int64'))
+
+    centre, low, high = overlaySeries(rolling, overlay)
+    return (msToHours(timeOfDayMs[keep]), centre[keep],
+            None if low is None else low[keep], None if high is None else high[keep])
@@ -0,0 +1,237 @@
+import json
+import os
+
+import numpy as np
+
+from sidecar import readCsv, sidecarFolder, sourceStamp
+from time_axis import displayOffsets, timeOfDay, timezoneColumn
+
+pyramidVersion = 2
+
+# Bucket sizes in ms, finest first. Every level keeps min, max, mean, count and sum per stream, so zoomed
+# out plots can be drawn from a handful of buckets instead of every minute row.
+pyramidLevels = [('1 min', 60 * 1000), ('5 min', 5 * 60 * 1000), ('15 min', 15 * 60 * 1000),
+                 ('1 h', 60 * 60 * 1000), ('1 day', 24 * 60 * 60 * 1000)]
+pyramidStats = ['min', 'max', 'mean', 'count', 'sum']
+
+
+def bucketValues(bucketIds, values):
+    # Stats of values grouped by bucketIds (which must be sorted), blanks are skipped
+    values = np.asarray(values, dtype='float64')
+    starts = np.flatnonzero(np.diff(bucketIds, prepend=bucketIds[0] - 1))
+    present = ~np.isnan(values)
+
+    count = np.add.reduceat(present.astype('int64'), starts)
+    total = np.add.reduceat(np.where(present, values, 0.0), starts)
+    low = np.minimum.reduceat(np.where(present, values, np.inf), starts)
+    high = np.maximum.reduceat(np.where(present, values, -np.inf), starts)
+
+    empty = count == 0
+    low[empty] = np.nan
+    high[empty] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    return {'min': low, 'max': high, 'mean': mean, 'count': count, 'sum': total}
+
+
+def mergeStats(a, b):
+    # Combines the stats of two sets of the same buckets
+    count = a['count'] + b['count']
+    total = a['sum'] + b['sum']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    return {'min': np.fmin(a['min'], b['min']), 'max': np.fmax(a['max'], b['max']), 'mean': mean,
+            'count': count, 'sum': total}
+
+
+def regroup(stats, bucketIds):
+    # Rolls finer buckets up into coarser ones without looking at the rows again
+    starts = np.flatnonzero(np.diff(bucketIds, prepend=bucketIds[0] - 1))
+    count = np.add.reduceat(stats['count'], starts)
+    total = np.add.reduceat(stats['sum'], starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    return {'min': np.fmin.reduceat(stats['min'], starts), 'max': np.fmax.reduceat(stats['max'], starts),
+            'mean': mean, 'count': count, 'sum': total}
+
+
+class AggregatePyramid:
+
+    def __init__(self, streams):
+        self.streams = list(streams)
+        # level name -> {'start': bucket start ms, 'timezone': minutes, stream: {stat: array}}
+        self.levels = {}
+        self.rows = 0
+        self.firstTimestamp = None
+        self.lastTimestamp = None
+        self.timeOfDayCache = {}
+
+    def buildLevels(self, timestamps, timezones, columns):
+        finest = {}
+        size = pyramidLevels[0][1]
+        bucketIds = timestamps // size
+        firstRows = np.flatnonzero(np.diff(bucketIds, prepend=bucketIds[0] - 1))
+        finest['start'] = bucketIds[firstRows] * size
+        finest['timezone'] = np.asarray(timezones)[firstRows].astype('int64')
+        for stream in self.streams:
+            finest[stream] = bucketValues(bucketIds, columns[stream])
+
+        levels = {pyramidLevels[0][0]: finest}
+        for name, size in pyramidLevels[1:]:
+            bucketIds = finest['start'] // size
+            firstRows = np.flatnonzero(np.diff(bucketIds, prepend=bucketIds[0] - 1))
+            level = {'start': bucketIds[firstRows] * size, 'timezone': finest['timezone'][firstRows]}
+            for stream in self.streams:
+                level[stream] = regroup(finest[stream], bucketIds)
+            levels[name] = level
+        return levels
+
+    def build(self, timestamps, timezones, columns):
+        timestamps = np.asarray(timestamps, dtype='int64')
+        order = timestamps.argsort(kind='stable')
+        timestamps = timestamps[order]
+
+        self.rows = len(timestamps)
+        self.timeOfDayCache = {}
+        if self.rows == 0:
+            self.levels = {}
+            return self
+
+        self.firstTimestamp, self.lastTimestamp = int(timestamps[0]), int(timestamps[-1])
+        self.levels = self.buildLevels(timestamps, np.asarray(timezones)[order],
+                                       {stream: np.asarray(columns[stream])[order] for stream in self.streams})
+        return self
+
+    def append(self, timestamps, timezones, columns):
+        # New rows that come after everything already in the pyramid only touch the last bucket of each level
+        timestamps = np.asarray(timestamps, dtype='int64')
+        if len(timestamps) == 0:
+            return self
+        if not self.levels:
+            return self.build(timestamps, timezones, columns)
+
+        newLevels = self.buildLevels(timestamps, timezones, columns)
+        for name, size in pyramidLevels:
+            old, new = self.levels[name], newLevels[name]
+            overlap = old['start'][-1] == new['start'][0]
+
+            for stream in self.streams:
+                head = {stat: old[stream][stat][:-1] if overlap else old[stream][stat] for stat in pyramidStats}
+                tail = new[stream]
+                if overlap:
+                    last = {stat: old[stream][stat][-1:] for stat in pyramidStats}
+                    first = {stat: tail[stat][:1] for stat in pyramidStats}
+                    merged = mergeStats(last, first)
+                    tail = {stat: np.concatenate([merged[stat], tail[stat][1:]]) for stat in pyramidStats}
+                old[stream] = {stat: np.concatenate([head[stat], tail[stat]]) for stat in pyramidStats}
+
+            keep = len(old['start']) - (1 if overlap else 0)
+            old['start'] = np.concatenate([old['start'][:keep], new['start']])
+            old['timezone'] = np.concatenate([old['timezone'][:keep], new['timezone']])
+
+        self.rows += len(timestamps)
+        self.lastTimestamp = int(timestamps.max())
+        self.timeOfDayCache = {}
+        return self
+
+    def nbytes(self):
+        return sum(array.nbytes for level in self.levels.values() for name, value in level.items()
+                   for array in (value.values() if isinstance(value, dict) else [value]))
+
+    def save(self, path, source):
+        arrays = {}
+        for name, level in self.levels.items():
+            arrays[f'{name}/start'] = level['start']
+            arrays[f'{name}/timezone'] = level['timezone']
+            for stream in self.streams:
+                for stat in pyramidStats:
+                    arrays[f'{name}/{stream}/{stat}'] = level[stream][stat]
+
+        meta = {'version': pyramidVersion, 'source': source, 'streams': self.streams, 'rows': self.rows,
+                'first': self.firstTimestamp, 'last': self.lastTimestamp}
+        with open(path, 'wb') as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['__meta__']))
+            if meta['version'] != pyramidVersion:
+                return None, None
+
+            pyramid = cls(meta['streams'])
+            pyramid.rows, pyramid.firstTimestamp, pyramid.lastTimestamp = meta['rows'], meta['first'], meta['last']
+            for name, size in pyramidLevels:
+                if f'{name}/start' not in data:
+                    continue
+                level = {'start': data[f'{name}/start'], 'timezone': data[f'{name}/timezone']}
+                for stream in pyramid.streams:
+                    level[stream] = {stat: data[f'{name}/{stream}/{stat}'] for stat in pyramidStats}
+                pyramid.levels[name] = level
+        return pyramid, meta['source']
+
+    def timeOfDay(self, name, timeMode):
+        # Bucket start times on the plot's time of day axis, sorted, worked out once per level and mode
+        key = (name, timeMode)
+        if key not in self.timeOfDayCache:
+            level = self.levels[name]
+            offsets = displayOffsets(timeMode, level['start'], level['timezone'])
+            timeOfDayMs = timeOfDay(level['start'], offsets)
+            order = timeOfDayMs.argsort(kind='stable')
+            self.timeOfDayCache[key] = (timeOfDayMs[order], order)
+        return self.timeOfDayCache[key]
+
+    def chooseLevel(self, timeMode, minBuckets, timeRange=None):
+        # The coarsest level that still has at least minBuckets buckets in the visible range
+        for name, size in reversed(pyramidLevels):
+            if name not in self.levels:
+                continue
+            timeOfDayMs, order = self.timeOfDay(name, timeMode)
+            if timeRange:
+                # The bucket times are sorted, so two binary searches count the visible ones
+                visible = (np.searchsorted(timeOfDayMs, timeRange[1], side='right')
+                           - np.searchsorted(timeOfDayMs, timeRange[0], side='left'))
+            else:
+                visible = len(timeOfDayMs)
+            if visible >= minBuckets:
+                return name
+        return None
+
+
+def loadPyramid(csvPath, streams):
+    # Loads the pyramid saved in the file's sidecar folder, extends it if rows were only appended to the
+    # csv since, or rebuilds it from scratch
+    columns = ['Unix Timestamp (UTC)', timezoneColumn] + list(streams)
+    path = os.path.join(sidecarFolder(csvPath), 'pyramid.npz')
+    source = sourceStamp(csvPath)
+
+    pyramid, savedSource = None, None
+    if os.path.isfile(path):
+        try:
+            pyramid, savedSource = AggregatePyramid.load(path)
+        except (OSError, ValueError, KeyError):
+            pyramid = None
+    if pyramid is not None and savedSource == source and pyramid.streams == list(streams):
+        return pyramid
+
+    # Rows without a timestamp or time zone can't be placed on a day
+    df = readCsv(csvPath, usecols=columns).dropna(subset=['Unix Timestamp (UTC)', timezoneColumn])
+    timestamps = df['Unix Timestamp (UTC)'].to_numpy(dtype='int64')
+    appended = (pyramid is not None and pyramid.streams == list(streams) and pyramid.rows
+                and len(timestamps) >= pyramid.rows
+                and timestamps[0] == pyramid.firstTimestamp and timestamps[pyramid.rows - 1] == pyramid.lastTimestamp
+                and timestamps[pyramid.rows:].min(initial=pyramid.lastTimestamp) >= pyramid.lastTimestamp)
+
+    if appended:
+        new = df.iloc[pyramid.rows:]
+        pyramid.append(new['Unix Timestamp (UTC)'].to_numpy(dtype='int64'), new[timezoneColumn].to_numpy(),
+                       {stream: new[stream].to_numpy() for stream in streams})
+    else:
+        pyramid = AggregatePyramid(streams).build(timestamps, df[timezoneColumn].to_numpy(),
+                                                  {stream: df[stream].to_numpy() for stream in streams})
+
+    try:
+        pyramid.save(path, source)
+    except OSError:
+        pass
+    return pyramid
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from catalog import DatasetCatalog
+from sidecar import readCsv
+from time_axis import timezoneColumn
+
+timestampColumn = 'Unix Timestamp (UTC)'
+
+
+def toEpochMs(value):
+    # Epoch milliseconds (ints or floats) as they are, anything else pd.Timestamp understands is read as UTC
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize('UTC')
+    return value.value // 1000000
+
+
+def fileRows(path, columns, available, startMs, endMs):
+    # Rows of one summary.csv inside [startMs, endMs]. The window is found by binary search over the
+    # timestamps, and only its rows of the other columns are read from the mmapped sidecar.
+    usecols = [column for column in columns if column in available]
+    timestamps = readCsv(path, usecols=[timestampColumn])[timestampColumn].to_numpy(dtype='float64')
+
+    if np.isnan(timestamps).any() or (np.diff(timestamps) < 0).any():
+        # Blanks or rows out of order: the whole file is read and sorted first
+        df = readCsv(path, usecols=usecols).reindex(columns=columns)
+        keep = np.flatnonzero(~np.isnan(timestamps))
+        keep = keep[timestamps[keep].argsort(kind='stable')]
+        df, timestamps = df.iloc[keep], timestamps[keep]
+        start = np.searchsorted(timestamps, startMs, side='left')
+        stop = np.searchsorted(timestamps, endMs, side='right')
+        return df.iloc[start:stop]
+
+    start = int(np.searchsorted(timestamps, startMs, side='left'))
+    stop = int(np.searchsorted(timestamps, endMs, side='right'))
+    return readCsv(path, usecols=usecols, start=start, stop=stop).reindex(columns=columns)
+
+
+def query(clients, streams, startUtc, endUtc, catalog=None):
+    # One frame of the given streams for every client between startUtc and endUtc (inclusive), e.g.
+    #   query(['310'], ['Eda avg', 'Temp avg'], '2020-01-18', '2020-01-21')
+    # Clients are participant ids ('310') or catalog client names ('20200118/310'). Only files whose
+    # catalog time bounds overlap the range are opened. Day files of the same participant are stitched
+    # in time order, and readings that show up in two files (around midnight) are kept once.
+    catalog = catalog if catalog is not None else DatasetCatalog()
+    startMs, endMs = toEpochMs(startUtc), toEpochMs(endUtc)
+    columns = [timestampColumn, timezoneColumn] + [stream for stream in streams
+                                                   if stream not in (timestampColumn, timezoneColumn)]
+    clients = [str(client) for client in clients]
+
+    entries = [entry for entry in catalog.overlapping(startMs, endMs)
+               if entry['participant'] in clients or entry['key'] in clients]
+
+    participants = {}
+    for entry in entries:
+        rows = fileRows(catalog.path(entry), columns, entry['columns'], startMs, endMs)
+        # Readings the previous day's file also holds come from that file, if it is part of the result
+        rows = rows[~catalog.sharedRows(entry, rows[timestampColumn], entries)]
+        participants.setdefault(entry['participant'], []).append(rows)
+
+    frames = []
+    for participant in sorted(participants):
+        df = pd.concat(participants[participant], ignore_index=True)
+        df = df.sort_values(timestampColumn, kind='stable')
+        df.insert(0, 'Participant', participant)
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(columns=['Participant'] + columns)
+
+    result = pd.concat(frames, ignore_index=True)
+    result['Participant'] = result['Participant'].astype('category')
+    return result
+
+
+if __name__ == "__main__":
+    df = query(['310'], ['Eda avg', 'Temp avg'], '2020-01-18', '2020-01-22')
+    print(df)
+
+    # Epoch milliseconds give the same rows whether they are ints or floats
+    assert query(['310'], ['Eda avg'], 1579392000000, 1579478400000).equals(
+        query(['310'], ['Eda avg'], 1579392000000.0, np.float64(1579478400000)))
@@ -0,0 +1,144 @@
+import numpy as np
+
+# Rows per block of the min/max tables. Whole blocks are answered from the sparse table, the at most two
+# partial blocks at the ends of a range are scanned, so a query never looks at more than 2 * blockRows rows.
+blockRows = 64
+
+
+class RangeIndex:
+    # Answers count, mean, std. dev, min and max of any [start, end] window of a view without going over
+    # its rows. It is built once per view (one pass per stream) from:
+    #   - prefix sums of the count, the values and their squares, for O(1) count, mean and std. dev.
+    #     The values are shifted by the stream's mean first so the sums of squares don't cancel out.
+    #   - a sparse table of the row holding the min and the max of every run of 2^k blocks, for O(1) min/max.
+    # Windows are found in the sorted time axis by binary search, so a whole query is O(log n).
+
+    def __init__(self, timeOfDayMs, view, streams):
+        self.timeOfDayMs = np.asarray(timeOfDayMs)
+        self.streams = {stream: self.buildStream(view[stream].to_numpy(dtype='float64')) for stream in streams}
+
+    @staticmethod
+    def buildStream(values):
+        present = ~np.isnan(values)
+        shift = float(values[present].mean()) if present.any() else 0.0
+        shifted = np.where(present, values - shift, 0.0)
+
+        stream = {'shift': shift,
+                  'count': np.concatenate([[0], np.cumsum(present, dtype='int64')]),
+                  'sum': np.concatenate([[0.0], np.cumsum(shifted)]),
+                  'sumSquares': np.concatenate([[0.0], np.cumsum(shifted * shifted)]),
+                  # Missing values can never be the min or the max. The extra last row is a sentinel that
+                  # empty ranges point at.
+                  'low': np.append(np.where(present, values, np.inf), np.inf),
+                  'high': np.append(np.where(present, values, -np.inf), -np.inf)}
+        stream['lowTable'] = RangeIndex.buildTable(stream['low'], np.argmin)
+        stream['highTable'] = RangeIndex.buildTable(stream['high'], np.argmax)
+        return stream
+
+    @staticmethod
+    def buildTable(values, pick):
+        # table[k][b] is the row of the extreme of blocks b .. b + 2^k - 1 (values ends with the sentinel)
+        n = len(values) - 1
+        blocks = -(-n // blockRows)
+        padded = np.full(blocks * blockRows, values[-1])
+        padded[:n] = values[:n]
+        rows = pick(padded.reshape(blocks, blockRows), axis=1) + np.arange(blocks) * blockRows
+
+        table = [rows]
+        width = 1
+        while 2 * width <= blocks:
+            previous = table[-1]
+            left, right = previous[:-width], previous[width:]
+            if pick is np.argmin:
+                table.append(np.where(values[right] < values[left], right, left))
+            else:
+                table.append(np.where(values[right] > values[left], right, left))
+            width *= 2
+        return table
+
+    def rows(self, timeRange):
+        # [start, stop) rows of a time range (all rows for None)
+        if not timeRange:
+            return 0, len(self.timeOfDayMs)
+        start, end = timeRange
+        return (int(np.searchsorted(self.timeOfDayMs, start, side='left')),
+                int(np.searchsorted(self.timeOfDayMs, end, side='right')))
+
+    @staticmethod
+    def scanRows(values, starts, stops, pick):
+        # Extreme of short row ranges (at most one block each), all ranges at once. Empty ranges get the
+        # sentinel row.
+        sentinel = len(values) - 1
+        offsets = starts[:, None] + np.arange(blockRows)
+        inside = offsets < stops[:, None]
+        gathered = np.where(inside, values[np.clip(offsets, 0, sentinel)], values[sentinel])
+        rows = offsets[np.arange(len(starts)), pick(gathered, axis=1)]
+        return np.where(inside.any(axis=1), rows, sentinel)
+
+    def extremes(self, stream, starts, stops, which):
+        # Row of the min (which='low') or max (which='high') of every [starts[i], stops[i]) range,
+        # -1 where a range is empty or only has missing values
+        stream = self.streams[stream]
+        values, table = stream[which], stream[which + 'Table']
+        pick = np.argmin if which == 'low' else np.argmax
+        better = np.less if which == 'low' else np.greater
+        starts = np.asarray(starts, dtype='int64')
+        stops = np.asarray(stops, dtype='int64')
+
+        firstBlock = -(-starts // blockRows)
+        lastBlock = stops // blockRows
+
+        # The partial blocks at both ends (for a range inside one block both are the whole range)
+        best = self.scanRows(values, starts, np.minimum(stops, firstBlock * blockRows), pick)
+        tail = self.scanRows(values, np.maximum(lastBlock * blockRows, starts), stops, pick)
+        best = np.where(better(values[tail], values[best]), tail, best)
+
+        # Whole blocks: two overlapping runs of 2^k blocks cover them
+        whole = lastBlock > firstBlock
+        if whole.any():
+            blocks = (lastBlock - firstBlock)[whole]
+            levels = np.floor(np.log2(blocks)).astype('int64')
+            for level in np.unique(levels):
+                ranges = np.flatnonzero(whole)[levels == level]
+                for first in [firstBlock[ranges], lastBlock[ranges] - (1 << level)]:
+                    candidate = table[level][first]
+                    best[ranges] = np.where(better(values[candidate], values[best[ranges]]),
+                                            candidate, best[ranges])
+
+        empty = (stops <= starts) | ~np.isfinite(values[best])
+        return np.where(empty, -1, best)
+
+    def stats(self, stream, timeRange=None):
+        # {'count', 'mean', 'std', 'min', 'max'} of one stream inside a time range, like StreamingStats.summary
+        start, stop = self.rows(timeRange)
+        data = self.streams[stream]
+        count = int(data['count'][stop] - data['count'][start])
+        if count == 0:
+            return {'count': 0, 'mean': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan}
+
+        total = data['sum'][stop] - data['sum'][start]
+        squares = data['sumSquares'][stop] - data['sumSquares'][start]
+        variance = (squares - total * total / count) / (count - 1) if count > 1 else np.nan
+        low = self.extremes(stream, [start], [stop], 'low')[0]
+        high = self.extremes(stream, [start], [stop], 'high')[0]
+        return {'count': count, 'mean': float(data['shift'] + total / count),
+                'std': float(np.sqrt(max(variance, 0.0))) if count > 1 else np.nan,
+                'min': float(data['low'][low]), 'max': float(data['high'][high])}
+
+    def minMaxRows(self, stream, start, stop, buckets):
+        # Same picks as decimate.minMaxIndices on rows [start, stop), but from the tables: the lowest and
+        # highest row of every bucket, as sorted row numbers of the whole view
+        if buckets * 2 >= stop - start or buckets < 1:
+            return np.arange(start, stop)
+
+        size = -(-(stop - start) // buckets)
+        starts = np.arange(start, stop, size)
+        stops = np.minimum(starts + size, stop)
+        rows = np.concatenate([self.extremes(stream, starts, stops, 'low'),
+                               self.extremes(stream, starts, stops, 'high')])
+        return np.unique(rows[rows >= 0])
+
+    def nbytes(self):
+        return sum(array.nbytes for stream in self.streams.values()
+                   for key, value in stream.items() if key != 'shift'
+                   for array in (value if isinstance(value, list) else [value]))
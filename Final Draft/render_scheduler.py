@@ -0,0 +1,25 @@
+class RenderScheduler:
+    # Coalesces redraw requests from the UI. Each request marks the plot dirty and (re)starts a short
+    # timer on the Tk event loop, so a burst of dropdown changes ends in one render with the latest
+    # settings instead of one full reload and draw per change.
+
+    def __init__(self, widget, render, delayMs=30):
+        self.widget = widget
+        self.render = render
+        self.delayMs = delayMs
+        self.pending = None
+
+    def request(self, *args):
+        # Accepts and ignores the arguments Tk passes to traces and OptionMenu commands
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+        self.pending = self.widget.after(self.delayMs, self.run)
+
+    def run(self):
+        self.pending = None
+        self.render()
+
+    def cancel(self):
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+            self.pending = None
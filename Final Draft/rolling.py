@@ -0,0 +1,75 @@
+import operator
+from collections import deque
+
+import numpy as np
+
+from time_axis import msPerHour, msPerMinute
+
+# Trailing windows the rolling overlay can use. A window covers the readings of the last windowMs
+# milliseconds up to and including each row, so gaps in a recording don't stretch it.
+rollingWindows = {'5 min': 5 * msPerMinute, '15 min': 15 * msPerMinute, '1 h': msPerHour, '4 h': 4 * msPerHour}
+# What the overlay draws: a centre line and, except for the z-score, a band around it
+rollingOverlays = ['Off', 'Mean ± std. dev', 'Min/Max', 'Z-score']
+
+
+def windowStarts(timestamps, windowMs):
+    # First row of the window that ends at every row, by binary search on the sorted timestamps
+    return np.searchsorted(timestamps, timestamps - windowMs, side='right')
+
+
+def slidingExtreme(values, starts, better):
+    # Min (better=operator.lt) or max (operator.gt) of values[starts[i]:i + 1] for every i in O(n).
+    # The deque holds the rows that could still become the extreme, their values in strictly better order,
+    # so every row is pushed and popped at most once. Missing values are never pushed.
+    result = np.full(len(values), np.nan)
+    window = deque()
+    values = values.tolist()
+    for i, (value, start) in enumerate(zip(values, starts.tolist())):
+        if value == value:
+            while window and not better(values[window[-1]], value):
+                window.pop()
+            window.append(i)
+        while window and window[0] < start:
+            window.popleft()
+        if window:
+            result[i] = values[window[0]]
+    return result
+
+
+def rollingStats(timestamps, values, windowMs):
+    # {'mean', 'std', 'min', 'max', 'zscore'} of the trailing window at every row. timestamps must be
+    # sorted. Count, mean and std. dev are differences of prefix sums, which are shifted by the overall
+    # mean so the sum of squares doesn't cancel out. Everything is O(n) whatever the window length.
+    timestamps = np.asarray(timestamps, dtype='int64')
+    values = np.asarray(values, dtype='float64')
+    starts = windowStarts(timestamps, windowMs)
+    stops = np.arange(1, len(values) + 1)
+
+    present = ~np.isnan(values)
+    shift = float(values[present].mean()) if present.any() else 0.0
+    shifted = np.where(present, values - shift, 0.0)
+    counts = np.concatenate([[0], np.cumsum(present, dtype='int64')])
+    sums = np.concatenate([[0.0], np.cumsum(shifted)])
+    squares = np.concatenate([[0.0], np.cumsum(shifted * shifted)])
+
+    count = counts[stops] - counts[starts]
+    total = sums[stops] - sums[starts]
+    totalSquares = squares[stops] - squares[starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, shift + total / count, np.nan)
+        variance = np.where(count > 1, (totalSquares - total * total / count) / (count - 1), np.nan)
+        std = np.sqrt(np.maximum(variance, 0.0))
+        zscore = np.where(std > 0, (values - mean) / std, np.nan)
+
+    return {'mean': mean, 'std': std, 'zscore': zscore,
+            'min': slidingExtreme(values, starts, operator.lt),
+            'max': slidingExtreme(values, starts, operator.gt)}
+
+
+def overlaySeries(stats, overlay):
+    # (centre, low, high) of an overlay, low and high are None when it has no band
+    if overlay == 'Mean ± std. dev':
+        return stats['mean'], stats['mean'] - stats['std'], stats['mean'] + stats['std']
+    if overlay == 'Min/Max':
+        return stats['mean'], stats['min'], stats['max']
+    return stats['zscore'], None, None
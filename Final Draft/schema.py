@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# Compact dtypes applied to every csv when it is read. pd.read_csv on its own loads everything as
+# float64/int64/strings, which is 3-4x more memory than the values need.
+compactSchema = {
+    'Datetime (UTC)': 'datetime',
+    'Unix Timestamp (UTC)': 'int64',
+    'Timezone (minutes)': 'int16',
+    'Acc magnitude avg': 'float32',
+    'Eda avg': 'float32',
+    'Temp avg': 'float32',
+    'Movement intensity': 'int16',
+    'Steps count': 'int16',
+    'Rest': 'uint8',
+    'On Wrist': 'bool'
+}
+
+# Columns that are added by the loaders rather than read from the files
+categoricalColumns = ['Participant', 'Date']
+
+
+def compactColumn(values, target):
+    if target == 'datetime':
+        return pd.to_datetime(values, utc=True, errors='coerce')
+
+    if target == 'bool':
+        if pd.api.types.is_bool_dtype(values):
+            return values
+        mapped = values.astype(str).str.lower().map({'true': 1.0, 'false': 0.0, '1': 1.0, '0': 0.0,
+                                                     '1.0': 1.0, '0.0': 0.0})
+        # Blanks can't be stored in a plain bool column, so those files get float32 1.0/0.0/NaN like the
+        # integer columns below, which every stream can still be converted from
+        return mapped.astype('float32') if mapped.isna().any() else mapped.astype(bool)
+
+    values = pd.to_numeric(values, errors='coerce')
+    if target.startswith('float'):
+        return values.astype(target)
+
+    # Integer columns with blanks fall back to float32, and values out of range keep the wider type.
+    # float32 only holds integers up to 2^24 exactly, so int64 columns (the epoch-ms timestamp) use
+    # float64 instead, which is exact up to 2^53.
+    if values.isna().any():
+        return values.astype('float64' if target == 'int64' else 'float32')
+    limits = np.iinfo(target)
+    if len(values) and (values.min() < limits.min or values.max() > limits.max):
+        return values
+    return values.astype(target)
+
+
+def frameBytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def applySchema(df):
+    # Returns the compacted frame and how much memory it takes before and after
+    before = frameBytes(df)
+    df = df.copy()
+
+    for name in df.columns:
+        if name in compactSchema:
+            df[name] = compactColumn(df[name], compactSchema[name])
+        elif name in categoricalColumns:
+            df[name] = df[name].astype('category')
+
+    return df, {'before': before, 'after': frameBytes(df)}
+
@@ -0,0 +1,308 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import applySchema
+
+# Every csv gets a folder of .npy files (one per column) next to it, e.g.
+# Dataset/20200118/310/.sidecar/summary.csv/manifest.json
+# The manifest remembers the mtime and size of the csv it was built from, so it is rebuilt
+# automatically whenever the csv changes. Numeric columns are opened with mmap instead of being parsed.
+sidecarFolderName = '.sidecar'
+manifestVersion = 3
+
+# Files bigger than this are parsed in chunks of chunkRows rows when their sidecar is built
+streamingThreshold = 64 * 1024 * 1024
+chunkRows = 200000
+
+
+def sidecarFolder(csvPath):
+    folder, name = os.path.split(os.path.abspath(csvPath))
+    return os.path.join(folder, sidecarFolderName, name)
+
+
+def sourceStamp(csvPath):
+    stat = os.stat(csvPath)
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def loadManifest(csvPath):
+    manifestPath = os.path.join(sidecarFolder(csvPath), 'manifest.json')
+
+    try:
+        with open(manifestPath) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('version') != manifestVersion or manifest.get('source') != sourceStamp(csvPath):
+        return None
+    return manifest
+
+
+def encodeColumn(values, column):
+    # Fills in the column's kind and returns (array, mask of blanks or None)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        # Datetimes are stored as epoch milliseconds, the timezone goes into the manifest
+        column['kind'] = 'datetime'
+        column['tz'] = None if values.dt.tz is None else str(values.dt.tz)
+        if values.dt.tz is not None:
+            values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+        return values.to_numpy(dtype='datetime64[ms]'), None
+
+    if not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values)):
+        # Text columns are stored as fixed width unicode (which can also be mmapped) plus a mask for blanks
+        column['kind'] = 'text'
+        return values.fillna('').astype(str).to_numpy(dtype=str), values.isna().to_numpy()
+
+    column['kind'] = 'numeric'
+    return values.to_numpy(), None
+
+
+def saveManifest(csvPath, rows, columns, memory):
+    # The manifest goes last, so a half written sidecar is never picked up
+    manifest = {'version': manifestVersion, 'source': sourceStamp(csvPath), 'rows': rows, 'columns': columns,
+                'memory': memory}
+    with open(os.path.join(sidecarFolder(csvPath), 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def saveMask(folder, column, missing):
+    if missing is not None and missing.any():
+        column['mask'] = column['file'].replace('.npy', '.mask.npy')
+        np.save(os.path.join(folder, column['mask']), missing)
+
+
+def writeSidecar(csvPath, df, memory=None):
+    folder = sidecarFolder(csvPath)
+    os.makedirs(folder, exist_ok=True)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = {'name': name, 'file': f'col{i}.npy'}
+        array, missing = encodeColumn(df[name], column)
+        saveMask(folder, column, missing)
+        np.save(os.path.join(folder, column['file']), array)
+        columns.append(column)
+
+    return saveManifest(csvPath, len(df), columns, memory)
+
+
+def sidecarChunks(csvPath, chunks):
+    # Writes the sidecar from pd.read_csv(..., chunksize=...) and yields every chunk, with the compact schema
+    # applied, as soon as it has been written, so its rows can be used while the rest of the file is still
+    # being converted. Only one chunk is in memory at a time: numeric columns are appended to raw files and
+    # turned into .npy files at the end, when the generator returns the manifest.
+    # If the sidecar can't be written (e.g. a read only folder) the chunks still come through and it returns None.
+    folder = sidecarFolder(csvPath)
+    columns, pieces, rawFiles = None, None, []
+    rows = 0
+    memory = {'before': 0, 'after': 0}
+    writing, finished = True, False
+
+    try:
+        for chunk in chunks:
+            df, chunkMemory = applySchema(chunk)
+            memory['before'] += chunkMemory['before']
+            memory['after'] += chunkMemory['after']
+
+            if columns is None:
+                columns = [{'name': name, 'file': f'col{i}.npy'} for i, name in enumerate(df.columns)]
+                pieces = [[] for _ in columns]
+                try:
+                    os.makedirs(folder, exist_ok=True)
+                    for column in columns:
+                        rawFiles.append(open(os.path.join(folder, column['file'] + '.raw'), 'wb'))
+                except OSError:
+                    writing = False
+
+            for i, (column, columnPieces) in enumerate(zip(columns, pieces)):
+                kind = column.get('kind')
+                array, missing = encodeColumn(df[column['name']], column)
+                if kind is not None and kind != column['kind']:
+                    raise ValueError(f"Column '{column['name']}' changes type between chunks")
+
+                if column['kind'] == 'text':
+                    # Text only shows up in the small metadata files, so it is simply kept in memory
+                    columnPieces.append((array, missing))
+                    continue
+                columnPieces.append((array.dtype, len(array)))
+                if writing:
+                    try:
+                        np.ascontiguousarray(array).tofile(rawFiles[i])
+                    except OSError:
+                        writing = False
+            rows += len(df)
+            yield df
+        finished = True
+    finally:
+        for rawFile in rawFiles:
+            rawFile.close()
+        if not (finished and writing):
+            # Stopped early or couldn't write: no manifest, so leftovers would never be read anyway
+            for rawFile in rawFiles:
+                try:
+                    os.remove(rawFile.name)
+                except OSError:
+                    pass
+
+    if columns is None:
+        raise pd.errors.EmptyDataError("No columns to parse from file")
+    if not writing:
+        return None
+
+    try:
+        for column, columnPieces in zip(columns, pieces):
+            path = os.path.join(folder, column['file'])
+
+            if column['kind'] == 'text':
+                np.save(path, np.concatenate([array for array, missing in columnPieces]))
+                saveMask(folder, column, np.concatenate([missing for array, missing in columnPieces]))
+                continue
+
+            # Chunks can come out with different dtypes (e.g. blanks in one of them), so use one that fits all
+            output = np.lib.format.open_memmap(path, mode='w+', shape=(rows,),
+                                               dtype=np.result_type(*[dtype for dtype, count in columnPieces]))
+            position = 0
+            with open(path + '.raw', 'rb') as rawFile:
+                for dtype, count in columnPieces:
+                    output[position:position + count] = np.fromfile(rawFile, dtype=dtype, count=count)
+                    position += count
+            output.flush()
+            os.remove(path + '.raw')
+
+        return saveManifest(csvPath, rows, columns, memory)
+    except OSError:
+        return None
+
+
+def writeSidecarChunks(csvPath, chunks):
+    # Same result as writeSidecar, but built from pd.read_csv(..., chunksize=...) so only one chunk is
+    # in memory at a time
+    writer = sidecarChunks(csvPath, chunks)
+    while True:
+        try:
+            next(writer)
+        except StopIteration as done:
+            manifest = done.value
+            break
+
+    if manifest is None:
+        raise OSError(f"Couldn't write the sidecar of {csvPath}")
+    return manifest
+
+
+def selectColumns(names, usecols):
+    if usecols is None:
+        return list(names)
+
+    missing = [name for name in usecols if name not in names]
+    if missing:
+        raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+
+    # Keep the file's column order, the same as pd.read_csv does
+    return [name for name in names if name in usecols]
+
+
+def loadColumns(csvPath, manifest, usecols=None, start=None, stop=None):
+    folder = sidecarFolder(csvPath)
+    available = {column['name']: column for column in manifest['columns']}
+    usecols = selectColumns([column['name'] for column in manifest['columns']], usecols)
+    rows = slice(start, stop)
+
+    data = {}
+    for name in usecols:
+        column = available[name]
+        array = np.load(os.path.join(folder, column['file']), mmap_mode='r')[rows]
+
+        if column['kind'] == 'text':
+            values = pd.Series(array)
+            if 'mask' in column:
+                values[np.load(os.path.join(folder, column['mask']))[rows]] = np.nan
+            data[name] = values
+        elif column['kind'] == 'datetime':
+            values = pd.Series(array)
+            data[name] = values if column['tz'] is None else values.dt.tz_localize('UTC').dt.tz_convert(column['tz'])
+        else:
+            data[name] = array
+
+    df = pd.DataFrame(data, columns=usecols)
+    df.index = pd.RangeIndex(*rows.indices(manifest['rows']))
+    return df
+
+
+def buildSidecar(csvPath):
+    # Big files are converted chunk by chunk so they never have to fit in memory as text
+    if os.path.getsize(csvPath) > streamingThreshold:
+        return writeSidecarChunks(csvPath, pd.read_csv(csvPath, chunksize=chunkRows))
+
+    df, memory = applySchema(pd.read_csv(csvPath))
+    return writeSidecar(csvPath, df, memory)
+
+
+def readCsv(csvPath, usecols=None, start=None, stop=None):
+    # Drop-in replacement for pd.read_csv(csvPath, usecols=usecols) that goes through the sidecar.
+    # start and stop pick a range of rows, only those are copied out of the sidecar.
+    manifest = loadManifest(csvPath)
+
+    if manifest is None:
+        try:
+            manifest = buildSidecar(csvPath)
+        except OSError:
+            # Read only dataset folders still work, they just don't get a sidecar
+            return applySchema(pd.read_csv(csvPath, usecols=usecols))[0].iloc[start:stop]
+
+    return loadColumns(csvPath, manifest, usecols, start, stop)
+
+
+def iterCsv(csvPath, usecols=None, chunksize=None):
+    # Like pd.read_csv(csvPath, usecols=usecols, chunksize=chunksize), but each chunk is a slice of the
+    # mmapped sidecar, so memory stays bounded by the chunk size no matter how big the file is
+    chunksize = chunksize or chunkRows
+    manifest = loadManifest(csvPath)
+
+    if manifest is None:
+        # The sidecar is written chunk by chunk and every chunk is handed out as soon as it is done, so the
+        # first rows (and partial results) show up long before a big file has been converted
+        for df in sidecarChunks(csvPath, pd.read_csv(csvPath, chunksize=chunksize)):
+            yield df[selectColumns(df.columns, usecols)]
+        return
+
+    # An empty file still yields one (empty) chunk so callers get to see its columns
+    for start in range(0, max(manifest['rows'], 1), chunksize):
+        yield loadColumns(csvPath, manifest, usecols, start, start + chunksize)
+
+
+def memorySavings(csvPath):
+    # {'before': bytes as parsed by pd.read_csv, 'after': bytes with the compact schema}, or None
+    manifest = loadManifest(csvPath)
+    return None if manifest is None else manifest.get('memory')
+
+
+if __name__ == "__main__":
+    # Check that a file with blanks keeps its timestamps exact and every stream numeric, both when it
+    # is read in one go and chunk by chunk
+    import shutil
+    import tempfile
+
+    original = pd.read_csv(os.path.join('Dataset', '20200118', '310', 'summary.csv'))
+    blanked = original.astype(object)
+    blanked.loc[[0, 700], ['Unix Timestamp (UTC)', 'Timezone (minutes)', 'Steps count', 'On Wrist']] = np.nan
+    folder = tempfile.mkdtemp()
+    try:
+        csvPath = os.path.join(folder, 'summary.csv')
+        blanked.to_csv(csvPath, index=False)
+
+        for name, manifest in [('whole', buildSidecar(csvPath)),
+                               ('chunked', writeSidecarChunks(csvPath, pd.read_csv(csvPath, chunksize=500)))]:
+            df = loadColumns(csvPath, manifest)
+            present = df['Unix Timestamp (UTC)'].notna()
+            assert (df['Unix Timestamp (UTC)'][present] == original['Unix Timestamp (UTC)'][present]).all(), name
+            for stream in ['Eda avg', 'Steps count', 'Rest', 'On Wrist']:
+                df[stream].to_numpy(dtype='float64')
+            print(name, 'ok:', {column: str(df[column].dtype) for column in df.columns})
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,244 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from catalog import DatasetCatalog, previousDayFile, sharedRows
+from sidecar import readCsv, sidecarFolder, sourceStamp
+from time_axis import msPerDay, msPerMinute, timezoneColumn
+
+sketchVersion = 2
+
+# t-digest compression: a sketch keeps about compression / 2 centroids, finer towards both tails. Quantiles
+# are within a fraction of a percent of rank of the exact ones, whatever the number of values.
+compression = 300
+
+
+class QuantileSketch:
+    # Merging t-digest. Values are summarised by centroids (mean, weight) whose size is limited by the
+    # arcsine scale function, so the extremes stay single values and the middle is summed up coarsely.
+    # Sketches of different chunks, days or participants merge into one that is as accurate as a sketch
+    # of all their values at once, which sorting and a median over the raw columns can't do.
+
+    def __init__(self, means=None, weights=None, low=np.inf, high=-np.inf):
+        self.means = np.zeros(0) if means is None else np.asarray(means, dtype='float64')
+        self.weights = np.zeros(0) if weights is None else np.asarray(weights, dtype='float64')
+        self.low = float(low)
+        self.high = float(high)
+
+    @classmethod
+    def fromValues(cls, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls()
+        return cls(*cls.compress(values, np.ones(len(values))), values.min(), values.max())
+
+    @staticmethod
+    def compress(means, weights):
+        # Sorts the centroids and groups neighbours whose quantiles fall into the same unit of the scale
+        # k(q) = compression / (2 pi) * asin(2q - 1), all at once instead of one centroid at a time
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        middle = (np.cumsum(weights) - weights / 2) / total
+        scale = np.floor(compression / (2 * np.pi) * np.arcsin(2 * middle - 1))
+        starts = np.flatnonzero(np.diff(scale, prepend=scale[0] - 1))
+
+        merged = np.add.reduceat(weights, starts)
+        return np.add.reduceat(means * weights, starts) / merged, merged
+
+    def count(self):
+        return int(round(self.weights.sum()))
+
+    def add(self, values):
+        return self.merge(QuantileSketch.fromValues(values))
+
+    def merge(self, other):
+        if len(other.weights):
+            self.means, self.weights = self.compress(np.concatenate([self.means, other.means]),
+                                                     np.concatenate([self.weights, other.weights]))
+            self.low, self.high = min(self.low, other.low), max(self.high, other.high)
+        return self
+
+    def quantile(self, q):
+        # Value at quantile q (0..1, or an array of them), interpolated between centroid midpoints
+        q = np.asarray(q, dtype='float64')
+        if len(self.weights) == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+
+        total = self.weights.sum()
+        middles = np.cumsum(self.weights) - self.weights / 2
+        ranks = np.concatenate([[0.0], middles, [total]])
+        values = np.concatenate([[self.low], self.means, [self.high]])
+        result = np.interp(q * total, ranks, values)
+        return result if q.ndim else float(result)
+
+    def toArray(self):
+        return np.concatenate([[self.low, self.high], self.means, self.weights])
+
+    @classmethod
+    def fromArray(cls, array):
+        size = (len(array) - 2) // 2
+        return cls(array[2:2 + size], array[2 + size:], array[0], array[1])
+
+
+def participantDays(timestamps, timezoneMinutes):
+    # Participant local date of every row, as the YYYYMMDD the dataset folders are named after
+    local = np.asarray(timestamps, dtype='int64') + np.asarray(timezoneMinutes, dtype='int64') * msPerMinute
+    days = local // msPerDay
+    return days, pd.to_datetime(np.unique(days), unit='D').strftime('%Y%m%d').tolist()
+
+
+class DaySketches:
+    # One QuantileSketch per (participant local day, stream) of a summary.csv, kept next to it in the
+    # sidecar folder, so percentiles of any set of days only merge a few hundred centroids.
+    # Readings the previous day's file holds too get sketches of their own, so a whole file can still be
+    # summed up while sketches merged over several files count every reading once.
+
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.sketches = {}
+        self.shared = {}
+
+    def build(self, timestamps, timezoneMinutes, values, shared=None):
+        days, names = participantDays(timestamps, timezoneMinutes)
+        shared = np.zeros(len(days), dtype=bool) if shared is None else np.asarray(shared)
+        order = np.argsort(days, kind='stable')
+        starts = np.flatnonzero(np.diff(days[order], prepend=days[order][0] - 1)) if len(days) else []
+        stops = np.append(starts[1:], len(days)) if len(days) else []
+
+        for name, start, stop in zip(names, starts, stops):
+            rows = order[start:stop]
+            own, repeated = rows[~shared[rows]], rows[shared[rows]]
+            for stream in self.streams:
+                column = np.asarray(values[stream])
+                self.sketches[(name, stream)] = QuantileSketch.fromValues(column[own])
+                if len(repeated):
+                    self.shared[(name, stream)] = QuantileSketch.fromValues(column[repeated])
+        return self
+
+    def days(self):
+        return sorted({day for day, stream in self.sketches})
+
+    def merged(self, stream, days=None, shared=True):
+        # One sketch of a stream over the given days (all of them for None). shared=False leaves out the
+        # readings the previous day's file holds too.
+        sketch = QuantileSketch()
+        for day in self.days() if days is None else days:
+            for sketches in [self.sketches, self.shared] if shared else [self.sketches]:
+                if (day, stream) in sketches:
+                    sketch.merge(sketches[(day, stream)])
+        return sketch
+
+    def nbytes(self):
+        return sum(sketch.means.nbytes + sketch.weights.nbytes
+                   for sketches in [self.sketches, self.shared] for sketch in sketches.values())
+
+    def save(self, path, source):
+        arrays = {f'{day}/{stream}': self.sketches[(day, stream)].toArray() for day, stream in sorted(self.sketches)}
+        arrays.update({f'shared/{day}/{stream}': self.shared[(day, stream)].toArray()
+                       for day, stream in sorted(self.shared)})
+        meta = {'version': sketchVersion, 'source': source, 'streams': self.streams, 'compression': compression}
+        with open(path, 'wb') as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['__meta__']))
+            if meta['version'] != sketchVersion or meta['compression'] != compression:
+                return None, None
+
+            sketches = cls(meta['streams'])
+            for key in data.files:
+                if key.startswith('shared/'):
+                    day, stream = key.split('/', 2)[1:]
+                    sketches.shared[(day, stream)] = QuantileSketch.fromArray(data[key])
+                elif key != '__meta__':
+                    day, stream = key.split('/', 1)
+                    sketches.sketches[(day, stream)] = QuantileSketch.fromArray(data[key])
+        return sketches, meta['source']
+
+
+def loadSketches(csvPath, streams):
+    # Day sketches from the file's sidecar folder, rebuilt whenever the csv or the previous day's file changed
+    path = os.path.join(sidecarFolder(csvPath), 'sketches.npz')
+    previousPath = previousDayFile(csvPath)
+    source = [sourceStamp(csvPath), None if previousPath is None else sourceStamp(previousPath)]
+
+    if os.path.isfile(path):
+        try:
+            sketches, savedSource = DaySketches.load(path)
+        except (OSError, ValueError, KeyError):
+            sketches = None
+        if sketches is not None and savedSource == source and sketches.streams == list(streams):
+            return sketches
+
+    df = readCsv(csvPath, usecols=['Unix Timestamp (UTC)', timezoneColumn] + list(streams))
+    df = df.dropna(subset=['Unix Timestamp (UTC)', timezoneColumn])
+    timestamps = df['Unix Timestamp (UTC)'].to_numpy(dtype='int64')
+
+    sketches = DaySketches(streams).build(timestamps, df[timezoneColumn].to_numpy(),
+                                          {stream: df[stream].to_numpy(dtype='float64') for stream in streams},
+                                          sharedRows(timestamps, previousPath))
+    try:
+        sketches.save(path, source)
+    except OSError:
+        pass
+    return sketches
+
+
+def cohortQuantiles(clients, streams, quantiles, days=None, catalog=None):
+    # {stream: {'count', q: value for every q}} over any mix of participants and days, e.g.
+    #   cohortQuantiles(['310', '312'], ['Eda avg'], [0.05, 0.5, 0.95], days=['20200118', '20200119'])
+    # Clients are participant ids or catalog client names like in query.query, days are YYYYMMDD
+    # (all days for None). Only the saved sketches are read, the data files are opened just once to make them.
+    # Readings that two selected day files both hold are counted once.
+    catalog = catalog if catalog is not None else DatasetCatalog()
+    clients = [str(client) for client in clients]
+    entries = catalog.entries()
+    if days is not None:
+        # Local days are at most 14 h off UTC, so files with no rows within a day of them are skipped
+        starts = pd.to_datetime(list(days), format='%Y%m%d').to_numpy().astype('datetime64[ms]').astype('int64')
+        entries = catalog.overlapping(int(starts.min()) - msPerDay, int(starts.max()) + 2 * msPerDay)
+    entries = [entry for entry in entries if entry['participant'] in clients or entry['key'] in clients]
+
+    merged = {stream: QuantileSketch() for stream in streams}
+    selected = [entry for entry in entries if entry['rows']]
+    for entry in entries:
+        available = [stream for stream in streams if stream in entry['columns']]
+        if not available or not entry['rows']:
+            continue
+        path = catalog.path(entry)
+        sketches = loadSketches(path, available)
+
+        # Readings the previous day's file also holds are left out only when that file is merged too
+        previous = catalog.previousEntry(entry, selected)
+        for stream in available:
+            shared = previous is None or stream not in previous['columns']
+            merged[stream].merge(sketches.merged(stream, days, shared=shared))
+
+    results = {}
+    for stream, sketch in merged.items():
+        values = np.atleast_1d(sketch.quantile(quantiles)).tolist()
+        results[stream] = {'count': sketch.count(), **dict(zip(quantiles, values))}
+    return results
+
+
+if __name__ == "__main__":
+    print(cohortQuantiles(['310', '312'], ['Eda avg', 'Temp avg'], [0.05, 0.25, 0.5, 0.75, 0.95]))
+
+    # Check the counts: one catalog key counts every reading of its file, whole participants count the
+    # readings that two day files both hold once
+    catalog = DatasetCatalog()
+    for entry in catalog.entries():
+        rows = readCsv(catalog.path(entry), usecols=['Eda avg'])['Eda avg'].notna().sum()
+        assert cohortQuantiles([entry['key']], ['Eda avg'], [0.5], catalog=catalog)['Eda avg']['count'] == rows
+    for participant in {entry['participant'] for entry in catalog.entries()}:
+        frames = [readCsv(catalog.path(entry), usecols=['Unix Timestamp (UTC)', 'Eda avg'])
+                  for entry in catalog.entries([participant])]
+        rows = pd.concat(frames).dropna().drop_duplicates(subset='Unix Timestamp (UTC)')
+        assert cohortQuantiles([participant], ['Eda avg'], [0.5], catalog=catalog)['Eda avg']['count'] == len(rows)
+    print('Counts match the files')
@@ -0,0 +1,34 @@
+from plot_artists import ArtistManager
+
+
+class StreamPanels:
+    # Small multiples: one panel per stream, stacked on a shared time axis, so zooming or panning any
+    # panel moves all of them. The axes are only rebuilt when the set of streams changes, otherwise every
+    # panel's ArtistManager just gets new data.
+
+    def __init__(self, fig, canvas, formatter=None):
+        self.fig = fig
+        self.canvas = canvas
+        self.formatter = formatter
+        self.streams = []
+        self.panels = {}
+
+    def layout(self, streams):
+        if streams == self.streams:
+            return
+
+        self.fig.clear()
+        self.panels = {}
+        if streams:
+            axes = self.fig.subplots(len(streams), 1, sharex=True, squeeze=False)[:, 0]
+            for i, (ax, stream) in enumerate(zip(axes, streams)):
+                self.panels[stream] = ArtistManager(ax, self.canvas, formatter=self.formatter, showTitle=False,
+                                                    showXLabel=i == len(streams) - 1)
+        self.streams = list(streams)
+
+    def show(self, graphType, series):
+        # series is {stream: (x, y)} in the order the panels should be stacked
+        self.layout(list(series))
+        for stream, (xValues, yValues) in series.items():
+            self.panels[stream].show(graphType, xValues, yValues, stream)
+        self.canvas.draw_idle()
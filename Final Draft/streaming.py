@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from sidecar import iterCsv
+from sketch import QuantileSketch
+
+# Chunk by chunk pipeline for summary files that are too big to load at once. Every stage takes an
+# iterator of chunks and yields chunks, so they can be chained and only one chunk is in flight at a time:
+#
+#     stats = StreamingStats(['Eda avg'])
+#     df = collect(aggregate(dropInvalid(iterSummary(path, ['Eda avg'])), [stats]), onChunk=showProgress)
+
+
+def iterSummary(csvPath, columns, chunksize=None):
+    return iterCsv(csvPath, usecols=list(columns) + ['Unix Timestamp (UTC)'], chunksize=chunksize)
+
+
+def dropInvalid(chunks):
+    # Rows with missing values can't be plotted
+    for chunk in chunks:
+        yield chunk.dropna()
+
+
+def aggregate(chunks, aggregators):
+    # Lets anything with an update(chunk) method see each chunk as it goes past
+    for chunk in chunks:
+        for aggregator in aggregators:
+            aggregator.update(chunk)
+        yield chunk
+
+
+def collect(chunks, onChunk=None):
+    # Glues the chunks back into one frame. onChunk(chunk, rowsSoFar) is called after every chunk,
+    # so the caller can show partial results while a big file is still loading.
+    pieces = []
+    rows = 0
+
+    for chunk in chunks:
+        pieces.append(chunk)
+        rows += len(chunk)
+        if onChunk is not None:
+            onChunk(chunk, rows)
+
+    return pd.concat(pieces) if len(pieces) > 1 else pieces[0]
+
+
+class StreamingStats:
+    # Count, mean, std. dev, min, max and median of several columns in one scan. Every chunk is reduced
+    # for all columns at once and merged into the running state with Chan's parallel form of Welford's
+    # update, which stays accurate where the sum of squares cancels out. States of different chunks,
+    # files or threads can be merged. The median and other quantiles come from a t-digest per column,
+    # so memory stays bounded however many rows go through.
+
+    def __init__(self, columns, median=True):
+        self.columns = list(columns)
+        self.median = median
+        self.count = np.zeros(len(self.columns), dtype='int64')
+        self.mean = np.zeros(len(self.columns))
+        self.m2 = np.zeros(len(self.columns))
+        self.low = np.full(len(self.columns), np.inf)
+        self.high = np.full(len(self.columns), -np.inf)
+        self.sketches = [QuantileSketch() for _ in self.columns]
+
+    def combine(self, count, mean, m2, low, high):
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.mean
+            share = np.where(total > 0, count / np.maximum(total, 1), 0.0)
+            self.mean = np.where(count > 0, self.mean + delta * share, self.mean)
+            self.m2 = np.where(count > 0, self.m2 + m2 + delta * delta * self.count * share, self.m2)
+        self.count = total
+        self.low = np.fmin(self.low, low)
+        self.high = np.fmax(self.high, high)
+
+    def update(self, chunk):
+        values = chunk[self.columns].to_numpy(dtype='float64')
+        if values.ndim == 1:
+            values = values[:, None]
+        if len(values) == 0:
+            return
+
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(present, values, 0.0).sum(axis=0) / count
+            m2 = np.where(present, np.square(values - mean), 0.0).sum(axis=0)
+        mean = np.nan_to_num(mean)
+        low = np.where(count > 0, np.where(present, values, np.inf).min(axis=0), np.inf)
+        high = np.where(count > 0, np.where(present, values, -np.inf).max(axis=0), -np.inf)
+        self.combine(count, mean, m2, low, high)
+
+        if self.median:
+            for sketch, column, columnPresent in zip(self.sketches, values.T, present.T):
+                sketch.add(column[columnPresent])
+
+    def merge(self, other):
+        # Adds another StreamingStats over the same columns, as if its chunks had been seen here
+        self.combine(other.count, other.mean, other.m2, other.low, other.high)
+        for sketch, otherSketch in zip(self.sketches, other.sketches):
+            sketch.merge(otherSketch)
+        self.median = self.median and other.median
+        return self
+
+    def quantiles(self, column, quantiles):
+        # Values at quantiles (0..1) of a column, within the t-digest's error
+        return self.sketches[self.columns.index(column)].quantile(quantiles)
+
+    def summary(self, column):
+        i = self.columns.index(column)
+        count = int(self.count[i])
+        if count == 0:
+            return {'count': 0, 'mean': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan, 'median': np.nan}
+
+        median = self.sketches[i].quantile(0.5) if self.median else np.nan
+        return {'count': count, 'mean': float(self.mean[i]),
+                'std': float(np.sqrt(self.m2[i] / (count - 1))) if count > 1 else np.nan,
+                'min': float(self.low[i]), 'max': float(self.high[i]), 'median': median}
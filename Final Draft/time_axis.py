@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from tzlocal import get_localzone
+
+# The plots use time of day on the x-axis. It is worked out once per file as integer milliseconds
+# (epoch ms + display offset, modulo one day) so plotting and filtering never build datetime objects.
+msPerSecond = 1000
+msPerMinute = 60 * msPerSecond
+msPerHour = 60 * msPerMinute
+msPerDay = 24 * msPerHour
+
+timezoneColumn = 'Timezone (minutes)'
+
+# Viewer local is the timezone of the computer running the app, participant local comes from the
+# 'Timezone (minutes)' column that summary.csv has on every row
+timeModes = ['Viewer local', 'Participant local', 'UTC']
+
+
+def viewerOffsets(timestamps):
+    # Offset of the viewer's timezone from UTC for every timestamp, in ms (per row because of DST)
+    utc = pd.to_datetime(timestamps, unit='ms', utc=True)
+    local = utc.tz_convert(get_localzone()).tz_localize(None)
+    return (local - utc.tz_localize(None)).to_numpy().astype('timedelta64[ms]').astype('int64')
+
+
+def participantOffsets(timezoneMinutes):
+    return np.asarray(timezoneMinutes, dtype='int64') * msPerMinute
+
+
+def displayOffsets(mode, timestamps, timezoneMinutes=None):
+    # Offset in ms to add to every epoch timestamp to get wall clock time in the given mode
+    if mode == 'UTC':
+        return np.zeros(len(timestamps), dtype='int64')
+    if mode == 'Viewer local':
+        return viewerOffsets(timestamps)
+    if mode == 'Participant local':
+        if timezoneMinutes is None:
+            raise ValueError("Participant local time needs the 'Timezone (minutes)' column")
+        return participantOffsets(timezoneMinutes)
+    raise ValueError(f"Unknown time mode '{mode}'")
+
+
+def allOffsets(timestamps, timezoneMinutes=None):
+    return {mode: displayOffsets(mode, timestamps, timezoneMinutes) for mode in timeModes
+            if mode != 'Participant local' or timezoneMinutes is not None}
+
+
+def toWallClock(timestamps, offsets):
+    # Naive datetimes showing the wall clock time in the zone the offsets were made for
+    return pd.to_datetime(np.asarray(timestamps, dtype='int64') + offsets, unit='ms')
+
+
+def timeOfDay(timestamps, offsets):
+    return (np.asarray(timestamps, dtype='int64') + offsets) % msPerDay
+
+
+def clockToMs(hour, minute, second):
+    return ((hour * 60 + minute) * 60 + second) * msPerSecond
+
+
+def msToHours(ms):
+    return np.asarray(ms) / msPerHour
+
+
+def hoursToMs(hours):
+    return np.round(np.asarray(hours) * msPerHour).astype('int64')
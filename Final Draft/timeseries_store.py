@@ -0,0 +1,192 @@
+import json
+import os
+
+import numpy as np
+
+from catalog import DatasetCatalog, sharedRows
+from sidecar import readCsv
+
+storeVersion = 4
+
+# Every stream of every participant/day is packed into one contiguous array per column.
+# Segments for the same participant sit next to each other in date order, so one (participant, day)
+# or one whole participant is always a single contiguous range of rows.
+timestampColumn = 'Unix Timestamp (UTC)'
+timezoneColumn = 'Timezone (minutes)'
+# Marks the rows the participant's previous day file holds too (see catalog.sharedRows)
+sharedColumn = 'Shared'
+storeStreams = ['Eda avg', 'Temp avg', 'Acc magnitude avg', 'Movement intensity', 'Steps count', 'Rest', 'On Wrist']
+# The column files are sized before any data file is read, so every column has a fixed type. Streams are
+# float32 (the small counts and flags fit it exactly), so blanks and missing columns can be NaN.
+storeDtypes = {timestampColumn: 'int64', sharedColumn: 'bool'}
+
+
+def columnFile(name):
+    return name.lower().replace(' ', '_').replace('(', '').replace(')', '') + '.npy'
+
+
+def columnDtype(name):
+    return np.dtype(storeDtypes.get(name, 'float32'))
+
+
+class TimeSeriesStore:
+
+    def __init__(self, catalog=None, storeFolder=None):
+        self.catalog = catalog if catalog is not None else DatasetCatalog()
+        self.storeFolder = storeFolder or os.path.join(self.catalog.dataFolder, '.store')
+        self.segmentsPath = os.path.join(self.storeFolder, 'segments.json')
+        self.segmentList = []
+        self.participantRanges = {}
+        self.arrays = {}
+
+    def loadLayout(self):
+        try:
+            with open(self.segmentsPath) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def isStale(self):
+        layout = self.loadLayout()
+        if layout is None:
+            return True
+
+        sources = {entry['key']: [entry['mtime'], entry['size']] for entry in self.catalog.entries()}
+        return layout.get('version') != storeVersion or layout.get('sources') != sources
+
+    def oldSegments(self, columns):
+        # {key: segment} and the column arrays of the store on disk, if its rows can be copied into a new one
+        layout = self.loadLayout()
+        if layout is None or layout.get('version') != storeVersion or layout.get('columns') != columns:
+            return {}, {}
+        try:
+            arrays = {name: np.load(os.path.join(self.storeFolder, columnFile(name)), mmap_mode='r')
+                      for name in columns}
+        except (OSError, ValueError):
+            return {}, {}
+        return {segment['key']: segment for segment in layout['segments']}, arrays
+
+    def build(self):
+        # The column files are sized from the catalog's row counts and every file is written into them as
+        # soon as it is read, so only one file is in memory at a time. Segments whose file and previous day's
+        # file didn't change since the last build are copied from the old store instead of being read again.
+        os.makedirs(self.storeFolder, exist_ok=True)
+        entries = sorted(self.catalog.entries(), key=lambda entry: (entry['participant'], entry['date']))
+        columns = [timestampColumn, timezoneColumn, sharedColumn] + storeStreams
+        oldSegments, oldArrays = self.oldSegments(columns)
+
+        # Write to temporary files first so processes that have the old store open keep working
+        totalRows = sum(entry['rows'] for entry in entries)
+        outputs = {name: np.lib.format.open_memmap(os.path.join(self.storeFolder, columnFile(name) + '.tmp'),
+                                                   mode='w+', dtype=columnDtype(name), shape=(totalRows,))
+                   for name in columns}
+
+        segments = []
+        offset = 0
+        for entry in entries:
+            stop = offset + entry['rows']
+            previous = self.catalog.previousEntry(entry)
+            source = [[entry['mtime'], entry['size']],
+                      None if previous is None else [previous['mtime'], previous['size']]]
+
+            old = oldSegments.get(entry['key'])
+            if old is not None and old.get('source') == source and old['stop'] - old['start'] == entry['rows']:
+                for name in columns:
+                    outputs[name][offset:stop] = oldArrays[name][old['start']:old['stop']]
+                first, last = old['first'], old['last']
+            else:
+                # Rows without a timestamp can't be placed on the time axis, the catalog doesn't count them
+                path = self.catalog.path(entry)
+                df = readCsv(path, usecols=[name for name in columns if name in entry['columns']])
+                df = df.dropna(subset=[timestampColumn]).sort_values(timestampColumn, kind='stable')
+                if len(df) != entry['rows']:
+                    raise ValueError(f"{path} changed while the store was being built")
+
+                timestamps = df[timestampColumn].to_numpy(dtype='int64')
+                outputs[timestampColumn][offset:stop] = timestamps
+                outputs[sharedColumn][offset:stop] = sharedRows(timestamps, None if previous is None
+                                                                else self.catalog.path(previous))
+                for name in [timezoneColumn] + storeStreams:
+                    outputs[name][offset:stop] = df[name].to_numpy(dtype='float32') if name in df.columns else np.nan
+                first, last = (int(timestamps[0]), int(timestamps[-1])) if len(timestamps) else (None, None)
+
+            segments.append({'key': entry['key'], 'participant': entry['participant'], 'date': entry['date'],
+                             'start': offset, 'stop': stop, 'first': first, 'last': last, 'source': source})
+            offset = stop
+
+        for array in outputs.values():
+            array.flush()
+        outputs.clear()
+        oldArrays.clear()
+        for name in columns:
+            path = os.path.join(self.storeFolder, columnFile(name))
+            os.replace(path + '.tmp', path)
+
+        layout = {'version': storeVersion, 'columns': columns, 'segments': segments,
+                  'sources': {entry['key']: [entry['mtime'], entry['size']] for entry in entries}}
+        with open(self.segmentsPath, 'w') as f:
+            json.dump(layout, f, indent=1)
+
+    def open(self):
+        if self.isStale():
+            self.build()
+
+        layout = self.loadLayout()
+        self.segmentList = layout['segments']
+        self.arrays = {name: np.load(os.path.join(self.storeFolder, columnFile(name)), mmap_mode='r')
+                       for name in layout['columns']}
+
+        # Whole participant ranges, and whether their days follow each other without overlapping in time
+        self.participantRanges = {}
+        for participant in {segment['participant'] for segment in self.segmentList}:
+            segments = [segment for segment in self.segments(participant) if segment['first'] is not None]
+            ordered = all(previous['last'] < current['first'] for previous, current in zip(segments, segments[1:]))
+            self.participantRanges[participant] = (min(segment['start'] for segment in self.segments(participant)),
+                                                   max(segment['stop'] for segment in self.segments(participant)),
+                                                   ordered)
+        return self
+
+    def segments(self, participant=None, date=None):
+        return [segment for segment in self.segmentList
+                if (participant is None or segment['participant'] == participant)
+                and (date is None or segment['date'] == date)]
+
+    def rows(self, participant, date=None):
+        if date is None:
+            return self.participantRanges[participant][:2]
+
+        for segment in self.segments(participant, date):
+            return segment['start'], segment['stop']
+        raise KeyError(f"No data stored for participant {participant} on {date}")
+
+    def windowRows(self, start, stop, startMs=None, endMs=None):
+        timestamps = self.arrays[timestampColumn][start:stop]
+        lo = 0 if startMs is None else int(np.searchsorted(timestamps, startMs, side='left'))
+        hi = len(timestamps) if endMs is None else int(np.searchsorted(timestamps, endMs, side='right'))
+        return start + lo, start + hi
+
+    def slice(self, participant, stream, date=None, startMs=None, endMs=None):
+        # Returns (timestamps, values). One day, or a participant whose days don't overlap in time,
+        # comes straight out of the memmap without copying anything.
+        timestamps = self.arrays[timestampColumn]
+        values = self.arrays[stream]
+
+        if date is not None or self.participantRanges[participant][2]:
+            start, stop = self.windowRows(*self.rows(participant, date), startMs, endMs)
+            return timestamps[start:stop], values[start:stop]
+
+        # Day files that overlap at midnight are stitched without the rows the previous day already has,
+        # which copies
+        rows = np.concatenate([np.arange(*self.windowRows(segment['start'], segment['stop'], startMs, endMs))
+                               for segment in self.segments(participant)])
+        rows = rows[~self.arrays[sharedColumn][rows]]
+        rows = rows[timestamps[rows].argsort(kind='stable')]
+        return timestamps[rows], values[rows]
+
+
+if __name__ == "__main__":
+    store = TimeSeriesStore()
+    store.build()
+    store.open()
+    for segment in store.segments():
+        print(f"{segment['key']}: rows {segment['start']}-{segment['stop']}")
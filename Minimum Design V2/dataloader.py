@@ -1,5 +1,7 @@
 import os
+import time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
 
 class DataLoader():
@@ -15,7 +17,37 @@ class DataLoader():
         '20200121/310',
         '20200121/312'
     ]
-    def read_csv(self):
+
+    def __init__(self):
+        self.load_report = []
+
+    @staticmethod
+    def read_file(path):
+        # Read one csv and time it, errors are reported instead of raised so one bad file doesn't stop the batch
+        start = time.perf_counter()
+        try:
+            df = pd.read_csv(path)
+            error = None
+        except Exception as e:
+            df, error = None, f"{type(e).__name__}: {e}"
+        return df, {'path': path, 'seconds': time.perf_counter() - start, 'error': error}
+
+    def read_files(self, paths, workers=None):
+        if workers is None:
+            workers = min(len(paths), os.cpu_count() or 1) or 1
+
+        # pool.map keeps the results in the same order as paths
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(self.read_file, paths))
+
+        for df, file_report in results:
+            self.load_report.append(file_report)
+            if file_report['error'] is not None:
+                print(f"Could not load {file_report['path']}: {file_report['error']}")
+
+        return [df for df, file_report in results if df is not None]
+
+    def read_csv(self, workers=None):
         data_folder = 'Dataset'
 
         # List of all the date folders
@@ -46,10 +78,10 @@ class DataLoader():
                     if os.path.isfile(summary_file_path):
                         summary_files.append(summary_file_path)
 
-        # Load the metadata files into a DataFrame
-        metadata_df = [pd.read_csv(file) for file in metadata_files]
-        # Load the summary files into a DataFrame
-        summary_df = [pd.read_csv(file) for file in summary_files]
+        # Load the metadata and summary files in parallel
+        self.load_report = []
+        metadata_df = self.read_files(metadata_files, workers)
+        summary_df = self.read_files(summary_files, workers)
 
 
         return metadata_df,summary_df
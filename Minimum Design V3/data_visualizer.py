@@ -8,6 +8,7 @@ import os
 from datetime import datetime, timedelta
 from tzlocal import get_localzone
 import matplotlib.pyplot as plt
+from statistics_handler import StatisticsHandler
 
 
 # Apply custom style
@@ -30,6 +31,9 @@ class DataVisualizer:
 
     data_stream_names = ['Eda avg', 'Acc magnitude avg', 'Temp avg', 'Movement intensity', 'Steps count', 'Rest']
 
+    # Trailing windows for the rolling mean ± std. dev overlay
+    rolling_window_names = ['Off', '5min', '15min', '1h', '4h']
+
     def __init__(self, window):
         self.window = window
         self.window.title("RogerWare Prototype")
@@ -49,6 +53,7 @@ class DataVisualizer:
         time_range_btn.pack(side=tk.LEFT)
 
         self.df = pd.DataFrame()
+        self.statistics = None
         self.time_range = None
         self.filename = None
 
@@ -93,6 +98,20 @@ class DataVisualizer:
         self.client_dropdown = tk.OptionMenu(self.window, selected_client_var, *self.client_names)
         self.client_dropdown.pack()
 
+        selected_rolling_window_var = tk.StringVar(self.window)
+        selected_rolling_window_var.set(self.rolling_window_names[0])
+        self.rolling_window = self.rolling_window_names[0]
+
+        def on_rolling_window_selected(*args):
+            self.rolling_window = selected_rolling_window_var.get()
+            self.plot_data()
+
+        selected_rolling_window_var.trace('w', on_rolling_window_selected)
+
+        self.rolling_window_dropdown = tk.OptionMenu(self.window, selected_rolling_window_var,
+                                                     *self.rolling_window_names)
+        self.rolling_window_dropdown.pack()
+
         stats_btn = tk.Button(master=btn_frame, text="Show Statistics", command=self.show_stats)
         stats_btn.pack(side=tk.LEFT)
 
@@ -110,6 +129,7 @@ class DataVisualizer:
         self.ax.clear()
         self.canvas.draw()
         self.df = pd.DataFrame()
+        self.statistics = None
         self.time_range = None
         self.selected_data_stream = None
 
@@ -136,14 +156,23 @@ class DataVisualizer:
             messagebox.showerror("No Data", "Please load data first.")
             return
 
+        # Compute the basic statistics of the selected stream over the loaded rows, which are already
+        # limited to the time range
+        columns = [self.selected_data_stream]
+        results = self.statistics.compute_statistics(columns)
+        if results is None:
+            return
+
         # Create a new window
         stats_window = tk.Toplevel(self.window)
         stats_window.title("Statistics")
 
-        # Compute and display the basic statistics for the 'Acc magnitude avg' and 'Eda avg' columns
-        for column in [self.selected_data_stream]:
-            stats = self.df[column].describe()
-            stats_str = f"{column}:\nMean: {stats['mean']}\nMedian: {self.df[column].median()}\nStd. dev: {stats['std']}\nMin: {stats['min']}\nMax: {stats['max']}"
+        # Display them, with the IQR and the 5th and 95th percentiles
+        for column in columns:
+            stats = results.loc[column]
+            percentiles = self.statistics.compute_percentiles(column, (5, 95))
+            stats_str = f"{column}:\nMean: {stats['Mean']}\nMedian: {stats['Median']}\nStd. dev: {stats['Standard Deviation']}\nMin: {stats['Min']}\nMax: {stats['Max']}" \
+                        f"\nIQR: {percentiles['IQR']}\nP5: {percentiles['P5']}\nP95: {percentiles['P95']}"
 
             label = tk.Label(master=stats_window, text=stats_str, justify=tk.LEFT)
             label.pack()
@@ -172,9 +201,20 @@ class DataVisualizer:
             if self.time_range:
                 self.df = self.df[(self.df['Datetime'].dt.time >= self.time_range[0]) &
                                   (self.df['Datetime'].dt.time <= self.time_range[1])]
+            self.statistics = StatisticsHandler(self.df)
 
             self.ax.clear()
             self.df.plot(x='Datetime', y=self.selected_data_stream, ax=self.ax, legend=False)
+
+            if self.rolling_window != 'Off':
+                # Rolling mean with a band of one standard deviation either side
+                rolling = self.statistics.compute_rolling(self.selected_data_stream, self.rolling_window)
+                overlay = pd.DataFrame({'Mean': rolling['Mean'],
+                                        'Mean - std. dev': rolling['Mean'] - rolling['Standard Deviation'],
+                                        'Mean + std. dev': rolling['Mean'] + rolling['Standard Deviation']})
+                overlay.reset_index().plot(x='Datetime', y='Mean', ax=self.ax, legend=False, color='black')
+                overlay.reset_index().plot(x='Datetime', y=['Mean - std. dev', 'Mean + std. dev'], ax=self.ax,
+                                           legend=False, color='black', linestyle='--', linewidth=0.8)
             self.ax.set_xlabel("Time")
             self.ax.set_ylabel(self.selected_data_stream)
             self.ax.xaxis.set_major_formatter(plt.FuncFormatter(self.format_time))
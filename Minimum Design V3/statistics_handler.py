@@ -1,24 +1,76 @@
+import numpy as np
 import pandas as pd
 import tkinter.messagebox as messagebox
 
 
 class StatisticsHandler:
+    # One handler per loaded frame. Rolling results are kept per (stream, window) for as long as the
+    # frame is shown, so redrawing an overlay doesn't recompute it.
+
     def __init__(self, df):
         self.df = df
+        self.rolling_cache = {}
+        self.statistics_cache = {}
 
     def compute_statistics(self, data_stream):
+        # One stream gives a Series, a list of streams a DataFrame with one row per stream.
+        # The frame is already in memory, so the median is the exact one, and each set of streams is only
+        # worked out once per loaded frame.
+        data_streams = [data_stream] if isinstance(data_stream, str) else list(data_stream)
+        missing = [stream for stream in data_streams if stream not in self.df.columns]
+        if missing:
+            messagebox.showerror("Invalid Data Stream", f"The selected data stream '{missing[0]}' does not exist.")
+            return
+
+        key = tuple(data_streams)
+        if key not in self.statistics_cache:
+            statistics = self.df[data_streams].agg(['min', 'max', 'mean', 'median', 'std']).T
+            statistics.columns = ['Min', 'Max', 'Mean', 'Median', 'Standard Deviation']
+            self.statistics_cache[key] = statistics
+
+        statistics = self.statistics_cache[key]
+        return statistics.loc[data_stream] if isinstance(data_stream, str) else statistics
+
+    def compute_percentiles(self, data_stream, percentiles=(5, 25, 50, 75, 95)):
+        # Exact percentiles (0-100) of one stream, plus the IQR
         if data_stream not in self.df.columns:
             messagebox.showerror("Invalid Data Stream", f"The selected data stream '{data_stream}' does not exist.")
             return
 
         stream_data = self.df[data_stream]
+        result = pd.Series(stream_data.quantile(np.asarray(percentiles) / 100).to_numpy(),
+                           index=[f'P{percentile:g}' for percentile in percentiles])
+        result['IQR'] = stream_data.quantile(0.75) - stream_data.quantile(0.25)
+        return result
+
+    def compute_rolling(self, data_stream, window='15min', time_column='Datetime'):
+        # Moving mean, standard deviation, min, max and z-score of one stream over a trailing window, e.g.
+        # '15min' or '1h' of time when the frame has a time_column, or a number of rows otherwise.
+        # pandas keeps running sums for the mean and std and a monotonic deque for min/max, so this is
+        # O(n) whatever the window. The result is indexed like the plot's x axis and can be drawn over it.
+        if data_stream not in self.df.columns:
+            messagebox.showerror("Invalid Data Stream", f"The selected data stream '{data_stream}' does not exist.")
+            return
+
+        key = (data_stream, window)
+        if key in self.rolling_cache:
+            return self.rolling_cache[key]
+
+        if time_column in self.df.columns:
+            stream_data = self.df.set_index(time_column)[data_stream].sort_index()
+        else:
+            stream_data = self.df[data_stream]
+            window = int(window)
+        rolling = stream_data.rolling(window, min_periods=1)
 
-        statistics = {
-            'Min': stream_data.min(),
-            'Max': stream_data.max(),
-            'Mean': stream_data.mean(),
-            'Median': stream_data.median(),
-            'Standard Deviation': stream_data.std()
-        }
+        result = pd.DataFrame({
+            'Mean': rolling.mean(),
+            'Standard Deviation': rolling.std(),
+            'Min': rolling.min(),
+            'Max': rolling.max()
+        })
+        result['Z-Score'] = (stream_data - result['Mean']) / result['Standard Deviation'].where(
+            result['Standard Deviation'] > 0)
 
-        return pd.Series(statistics)
\ No newline at end of file
+        self.rolling_cache[key] = result
+        return result
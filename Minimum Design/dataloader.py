@@ -15,6 +15,12 @@ class DataLoader():
         '20200121/310',
         '20200121/312'
     ]
+
+    def __init__(self):
+        # client -> (metadata path, summary path), and client -> loaded (metadata, summary) frames
+        self.client_paths = {}
+        self.client_cache = {}
+
     def read_csv(self):
         data_folder = 'Dataset'
 
@@ -54,27 +60,26 @@ class DataLoader():
 
         return metadata_df,summary_df
 
-    def get_specific_client(self, client):
-        metadata_df, summary_df = self.read_csv()
-
-        if client in self.client_names:
-            client_metadata = None
-            client_summary = None
+    def get_client_paths(self, client):
+        # Client names are <date>/<participant>, which is also the folder holding that client's files
+        if client not in self.client_paths:
+            folder_path = os.path.join('Dataset', *client.split('/'))
+            self.client_paths[client] = (os.path.join(folder_path, 'metadata.csv'),
+                                         os.path.join(folder_path, 'summary.csv'))
+        return self.client_paths[client]
 
-            # Find the specific client's metadata and summary dataframes
-            for df in metadata_df:
-                if client in df['Client'].values:
-                    client_metadata = df
-                    break
+    def get_specific_client(self, client):
+        if client not in self.client_names:
+            return None, None
 
-            for df in summary_df:
-                if client in df['Client'].values:
-                    client_summary = df
-                    break
+        # Only this client's two files are read, and only the first time they are asked for
+        if client not in self.client_cache:
+            metadata_path, summary_path = self.get_client_paths(client)
+            client_metadata = pd.read_csv(metadata_path) if os.path.isfile(metadata_path) else None
+            client_summary = pd.read_csv(summary_path) if os.path.isfile(summary_path) else None
+            self.client_cache[client] = (client_metadata, client_summary)
 
-            return client_metadata, client_summary
-        else:
-            return None, None
+        return self.client_cache[client]
 
 # Example usage
 data_loader = DataLoader()